@@ -30,7 +30,8 @@ from .embeddings import Collection
 from .templates import Template
 from .plugins import pm, load_plugins
 import click
-from typing import Any, Dict, List, Optional, Callable, Type, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Callable, Tuple, Type, Union
 import inspect
 import json
 import os
@@ -128,11 +129,28 @@ def _get_loaders(hook_method) -> Dict[str, Callable]:
     return loaders
 
 
-def get_template_loaders() -> Dict[str, Callable[[str], Template]]:
-    """Get template loaders registered by plugins."""
+def _registered_plugins() -> Tuple:
+    # A snapshot of the registered plugins, used as a cache key so that
+    # registering or unregistering a plugin invalidates cached hook results
+    load_plugins()
+    return tuple(pm.list_name_plugin())
+
+
+@lru_cache(maxsize=1)
+def _cached_template_loaders(plugins: Tuple) -> Dict[str, Callable[[str], Template]]:
     return _get_loaders(pm.hook.register_template_loaders)
 
 
+def get_template_loaders() -> Dict[str, Callable[[str], Template]]:
+    """
+    Get template loaders registered by plugins.
+
+    The result is cached for as long as the same plugins are registered, see
+    clear_plugin_caches().
+    """
+    return dict(_cached_template_loaders(_registered_plugins()))
+
+
 def get_fragment_loaders() -> Dict[
     str,
     Callable[[str], Union[Fragment, Attachment, List[Union[Fragment, Attachment]]]],
@@ -142,8 +160,18 @@ def get_fragment_loaders() -> Dict[
 
 
 def get_tools() -> Dict[str, Union[Tool, Type[Toolbox]]]:
-    """Return all tools (llm.Tool and llm.Toolbox) registered by plugins."""
-    load_plugins()
+    """
+    Return all tools (llm.Tool and llm.Toolbox) registered by plugins.
+
+    The result is cached for as long as the same plugins are registered, see
+    clear_plugin_caches().
+    """
+    return dict(_cached_tools(_registered_plugins()))
+
+
+@lru_cache(maxsize=1)
+def _cached_tools(plugins: Tuple) -> Dict[str, Union[Tool, Type[Toolbox]]]:
+    # Plugin hooks are only called again if the registered plugins change
     tools: Dict[str, Union[Tool, Type[Toolbox]]] = {}
 
     # Variable to track current plugin name
@@ -214,6 +242,18 @@ def get_tools() -> Dict[str, Union[Tool, Type[Toolbox]]]:
     return tools
 
 
+def clear_plugin_caches() -> None:
+    """
+    Forget the cached results of get_tools() and get_template_loaders().
+
+    Those assume a plugin registers the same tools and template loaders for
+    as long as it stays registered. Call this if what a plugin registers
+    depends on configuration or environment that has since changed.
+    """
+    _cached_template_loaders.cache_clear()
+    _cached_tools.cache_clear()
+
+
 def get_embedding_models_with_aliases() -> List["EmbeddingModelWithAliases"]:
     model_aliases = []
 
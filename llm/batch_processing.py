@@ -15,6 +15,13 @@ import re
 
 from llm import get_model, user_dir
 
+# Matches {variable} placeholders in prompt templates
+_TEMPLATE_VAR_RE = re.compile(r"\{([^{}]+)\}")
+
+# Buffered results are also written once this many seconds have passed since
+# the last write, so progress stays visible while slow models run
+RESULT_FLUSH_INTERVAL = 5.0
+
 
 class BatchProcessor:
     """Manages batch processing of prompts."""
@@ -23,6 +30,8 @@ class BatchProcessor:
         if db_path is None:
             db_path = user_dir() / "batch.db"
         self.db_path = db_path
+        # Created on first use, then shared by every prompt in every batch
+        self._cost_tracker = None
         self._init_db()
 
     def _init_db(self):
@@ -90,9 +99,7 @@ class BatchProcessor:
             for idx, row in enumerate(reader):
                 if template:
                     # Substitute variables in template
-                    prompt = template
-                    for key, value in row.items():
-                        prompt = prompt.replace(f"{{{key}}}", str(value))
+                    prompt = self._apply_template(template, row)
                     yield {'index': idx, 'prompt': prompt, 'data': row}
                 else:
                     # Use first column as prompt
@@ -132,10 +139,11 @@ class BatchProcessor:
         if not template:
             return str(data)
 
-        prompt = template
-        for key, value in data.items():
-            prompt = prompt.replace(f"{{{key}}}", str(value))
-        return prompt
+        # A single pass over the template, rather than one per variable
+        return _TEMPLATE_VAR_RE.sub(
+            lambda match: str(data[match.group(1)]) if match.group(1) in data else match.group(0),
+            template
+        )
 
     def process_batch(
         self,
@@ -145,9 +153,17 @@ class BatchProcessor:
         system: Optional[str] = None,
         output_file: Optional[Path] = None,
         rate_limit: Optional[int] = None,
-        max_prompts: Optional[int] = None
+        max_prompts: Optional[int] = None,
+        batch_size: int = 100
     ) -> str:
-        """Process a batch of prompts."""
+        """
+        Process a batch of prompts.
+
+        Results are buffered and written to the database in one transaction
+        for every batch_size prompts, or every RESULT_FLUSH_INTERVAL seconds,
+        rather than committed one at a time. If the run is interrupted, the
+        buffered results are still written and the run is marked as failed.
+        """
         import ulid
 
         batch_id = str(ulid.ULID())
@@ -169,6 +185,8 @@ class BatchProcessor:
             'max_prompts': max_prompts
         }
 
+        # The parent batch_runs row is committed first, so that progress can be
+        # seen with "llm batch status" while the results are being processed
         conn = sqlite3.connect(str(self.db_path))
         conn.execute("""
             INSERT INTO batch_runs (
@@ -177,85 +195,55 @@ class BatchProcessor:
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             batch_id, created_at, str(input_file), str(output_file) if output_file else None,
-            model_name, total_prompts, 'running', json.dumps(config), datetime.utcnow().isoformat()
+            model_name, total_prompts, 'running', json.dumps(config), created_at
         ))
         conn.commit()
-        conn.close()
 
         # Process prompts
-        model = get_model(model_name)
         results = []
+        pending = []
         completed = 0
         failed = 0
-
-        for prompt_data in prompts:
-            try:
-                # Rate limiting
-                if rate_limit and completed > 0:
-                    time.sleep(60 / rate_limit)  # Sleep to maintain rate limit
-
-                response = model.prompt(prompt_data['prompt'], system=system)
-                response_text = response.text()
-
-                # Get token usage if available
-                tokens_used = 0
-                if hasattr(response, 'input_tokens') and hasattr(response, 'output_tokens'):
-                    tokens_used = response.input_tokens + response.output_tokens
-
-                # Calculate cost
-                cost = 0.0
-                if hasattr(response, 'input_tokens') and hasattr(response, 'output_tokens'):
-                    from llm.cost_tracking import CostTracker
-                    tracker = CostTracker()
-                    cost = tracker.calculate_cost(model_name, response.input_tokens, response.output_tokens)
-
-                result = {
-                    'index': prompt_data['index'],
-                    'prompt': prompt_data['prompt'],
-                    'response': response_text,
-                    'success': True,
-                    'error': None,
-                    'tokens': tokens_used,
-                    'cost': cost,
-                    'data': prompt_data.get('data', {})
-                }
-
-                results.append(result)
-                completed += 1
-
-                # Save result to database
-                self._save_result(batch_id, result)
-
-                # Update progress
-                self._update_progress(batch_id, completed, failed)
-
-            except Exception as e:
-                result = {
-                    'index': prompt_data['index'],
-                    'prompt': prompt_data['prompt'],
-                    'response': None,
-                    'success': False,
-                    'error': str(e),
-                    'tokens': 0,
-                    'cost': 0,
-                    'data': prompt_data.get('data', {})
-                }
-
+        last_flush = time.monotonic()
+        status = 'failed'
+
+        try:
+            model = get_model(model_name)
+            for prompt_data in prompts:
+                result = self._process_prompt(
+                    model, model_name, prompt_data, system, rate_limit, completed
+                )
                 results.append(result)
-                failed += 1
+                pending.append(result)
+                if result['success']:
+                    completed += 1
+                else:
+                    failed += 1
 
-                self._save_result(batch_id, result)
-                self._update_progress(batch_id, completed, failed)
+                if (
+                    len(pending) >= batch_size
+                    or time.monotonic() - last_flush >= RESULT_FLUSH_INTERVAL
+                ):
+                    self._flush_results(conn, batch_id, pending, completed, failed)
+                    last_flush = time.monotonic()
 
-        # Mark batch as completed
-        conn = sqlite3.connect(str(self.db_path))
-        conn.execute("""
-            UPDATE batch_runs
-            SET status = ?, completed_at = ?
-            WHERE id = ?
-        """, ('completed', datetime.utcnow().isoformat(), batch_id))
-        conn.commit()
-        conn.close()
+            status = 'completed'
+        finally:
+            try:
+                # Discard anything a failed write left uncommitted, then keep
+                # the results that were already paid for
+                conn.rollback()
+                self._flush_results(conn, batch_id, pending, completed, failed)
+
+                # Mark batch as completed, or as failed if it was interrupted
+                conn.execute("""
+                    UPDATE batch_runs
+                    SET status = ?, completed_at = ?
+                    WHERE id = ?
+                """, (status, datetime.utcnow().isoformat(), batch_id))
+                conn.commit()
+            finally:
+                conn.close()
 
         # Save results to output file if specified
         if output_file:
@@ -263,36 +251,97 @@ class BatchProcessor:
 
         return batch_id
 
-    def _save_result(self, batch_id: str, result: Dict[str, Any]):
-        """Save a batch result to database."""
-        import ulid
+    def _get_cost_tracker(self):
+        """Get the cost tracker, creating it the first time it is needed."""
+        if self._cost_tracker is None:
+            from llm.cost_tracking import CostTracker
+            self._cost_tracker = CostTracker()
+        return self._cost_tracker
 
-        result_id = str(ulid.ULID())
+    def _process_prompt(
+        self,
+        model,
+        model_name: str,
+        prompt_data: Dict[str, Any],
+        system: Optional[str],
+        rate_limit: Optional[int],
+        completed: int
+    ) -> Dict[str, Any]:
+        """Run a single prompt, returning a result dictionary."""
+        try:
+            # Rate limiting
+            if rate_limit and completed > 0:
+                time.sleep(60 / rate_limit)  # Sleep to maintain rate limit
+
+            response = model.prompt(prompt_data['prompt'], system=system)
+            response_text = response.text()
+
+            # Get token usage if available
+            tokens_used = 0
+            if hasattr(response, 'input_tokens') and hasattr(response, 'output_tokens'):
+                tokens_used = response.input_tokens + response.output_tokens
+
+            # Calculate cost
+            cost = 0.0
+            if hasattr(response, 'input_tokens') and hasattr(response, 'output_tokens'):
+                tracker = self._get_cost_tracker()
+                cost = tracker.calculate_cost(model_name, response.input_tokens, response.output_tokens)
+
+            return {
+                'index': prompt_data['index'],
+                'prompt': prompt_data['prompt'],
+                'response': response_text,
+                'success': True,
+                'error': None,
+                'tokens': tokens_used,
+                'cost': cost,
+                'data': prompt_data.get('data', {})
+            }
+
+        except Exception as e:
+            return {
+                'index': prompt_data['index'],
+                'prompt': prompt_data['prompt'],
+                'response': None,
+                'success': False,
+                'error': str(e),
+                'tokens': 0,
+                'cost': 0,
+                'data': prompt_data.get('data', {})
+            }
+
+    def _flush_results(
+        self,
+        conn: sqlite3.Connection,
+        batch_id: str,
+        pending: List[Dict[str, Any]],
+        completed: int,
+        failed: int
+    ):
+        """Write buffered results and batch progress in a single transaction."""
+        import ulid
 
-        conn = sqlite3.connect(str(self.db_path))
-        conn.execute("""
+        processed_at = datetime.utcnow().isoformat()
+        conn.executemany("""
             INSERT INTO batch_results (
                 id, batch_id, prompt_index, prompt, response,
                 success, error, tokens_used, cost, processed_at
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            result_id, batch_id, result['index'], result['prompt'],
-            result['response'], result['success'], result['error'],
-            result['tokens'], result['cost'], datetime.utcnow().isoformat()
-        ))
-        conn.commit()
-        conn.close()
-
-    def _update_progress(self, batch_id: str, completed: int, failed: int):
-        """Update batch progress."""
-        conn = sqlite3.connect(str(self.db_path))
+        """, [
+            (
+                str(ulid.ULID()), batch_id, result['index'], result['prompt'],
+                result['response'], result['success'], result['error'],
+                result['tokens'], result['cost'], processed_at
+            )
+            for result in pending
+        ])
         conn.execute("""
             UPDATE batch_runs
             SET completed_prompts = ?, failed_prompts = ?
             WHERE id = ?
         """, (completed, failed, batch_id))
         conn.commit()
-        conn.close()
+        pending.clear()
 
     def _save_output_file(self, output_file: Path, results: List[Dict[str, Any]], input_file: Path):
         """Save results to output file."""
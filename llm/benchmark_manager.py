@@ -7,9 +7,10 @@ Run standardized benchmarks to evaluate model performance.
 import json
 import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 from llm import user_dir, get_model
 
@@ -98,46 +99,19 @@ class BenchmarkManager:
         results = {}
         scores = {}
 
-        for model_name in models:
-            try:
-                model = get_model(model_name)
-                model_results = []
-
-                for test in test_cases:
-                    prompt = test.get("prompt", "")
-                    expected = test.get("expected", "")
-
-                    start_time = time.time()
-                    response = model.prompt(prompt)
-                    end_time = time.time()
-
-                    response_text = response.text()
-
-                    # Simple scoring (would be more sophisticated in production)
-                    score = 1.0 if expected.lower() in response_text.lower() else 0.0
-
-                    model_results.append({
-                        "prompt": prompt,
-                        "response": response_text,
-                        "expected": expected,
-                        "score": score,
-                        "time": end_time - start_time
-                    })
-
-                # Calculate aggregate score
-                avg_score = sum(r["score"] for r in model_results) / len(model_results) if model_results else 0
-                avg_time = sum(r["time"] for r in model_results) / len(model_results) if model_results else 0
-
-                results[model_name] = model_results
-                scores[model_name] = {
-                    "accuracy": avg_score,
-                    "avg_time": avg_time,
-                    "total_tests": len(model_results)
-                }
-
-            except Exception as e:
-                results[model_name] = []
-                scores[model_name] = {"error": str(e)}
+        # Each model is benchmarked independently over the network, so run
+        # them concurrently. executor.map() yields results in model order.
+        if models:
+            with ThreadPoolExecutor(max_workers=len(models)) as executor:
+                for model_name, (model_results, model_scores) in zip(
+                    models,
+                    executor.map(
+                        lambda model_name: self._run_model(model_name, test_cases),
+                        models
+                    )
+                ):
+                    results[model_name] = model_results
+                    scores[model_name] = model_scores
 
         # Save run
         conn = sqlite3.connect(str(self.db_path))
@@ -158,6 +132,50 @@ class BenchmarkManager:
 
         return run_id
 
+    def _run_model(
+        self,
+        model_name: str,
+        test_cases: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Run every test case against one model, returning (results, scores)."""
+        try:
+            model = get_model(model_name)
+            model_results = []
+
+            for test in test_cases:
+                prompt = test.get("prompt", "")
+                expected = test.get("expected", "")
+
+                start_time = time.time()
+                response = model.prompt(prompt)
+                end_time = time.time()
+
+                response_text = response.text()
+
+                # Simple scoring (would be more sophisticated in production)
+                score = 1.0 if expected.lower() in response_text.lower() else 0.0
+
+                model_results.append({
+                    "prompt": prompt,
+                    "response": response_text,
+                    "expected": expected,
+                    "score": score,
+                    "time": end_time - start_time
+                })
+
+            # Calculate aggregate score
+            avg_score = sum(r["score"] for r in model_results) / len(model_results) if model_results else 0
+            avg_time = sum(r["time"] for r in model_results) / len(model_results) if model_results else 0
+
+            return model_results, {
+                "accuracy": avg_score,
+                "avg_time": avg_time,
+                "total_tests": len(model_results)
+            }
+
+        except Exception as e:
+            return [], {"error": str(e)}
+
     def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
         """Get benchmark run results."""
         conn = sqlite3.connect(str(self.db_path))
@@ -39,6 +39,7 @@ class BranchManager:
                 created_at TEXT NOT NULL,
                 description TEXT,
                 active BOOLEAN DEFAULT 1,
+                message_count INTEGER NOT NULL DEFAULT 0,
                 UNIQUE(conversation_id, branch_name),
                 FOREIGN KEY (parent_branch_id) REFERENCES conversation_branches(id)
             )
@@ -54,6 +55,20 @@ class BranchManager:
             )
         """)
 
+        # Branches created before message_count was stored get it backfilled
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(conversation_branches)")}
+        if "message_count" not in columns:
+            conn.execute("""
+                ALTER TABLE conversation_branches
+                ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0
+            """)
+            conn.execute("""
+                UPDATE conversation_branches SET message_count = (
+                    SELECT COUNT(*) FROM branch_messages
+                    WHERE branch_id = conversation_branches.id
+                )
+            """)
+
         # Create indices
         conn.execute("""
             CREATE INDEX IF NOT EXISTS idx_branches_conversation
@@ -111,20 +126,23 @@ class BranchManager:
             conn.execute("""
                 INSERT INTO conversation_branches (
                     id, conversation_id, branch_name, parent_branch_id,
-                    branch_point_log_id, created_at, description, active
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    branch_point_log_id, created_at, description, active,
+                    message_count
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 branch_id, conversation_id, branch_name, parent_branch_id,
-                branch_point_log_id, created_at, description, True
+                branch_point_log_id, created_at, description, True,
+                len(branch_messages)
             ))
 
             # Add messages to branch
-            for i, msg in enumerate(branch_messages):
-                msg_id = str(ulid.ULID())
-                conn.execute("""
-                    INSERT INTO branch_messages (id, branch_id, log_id, sequence)
-                    VALUES (?, ?, ?, ?)
-                """, (msg_id, branch_id, msg["id"], i))
+            conn.executemany("""
+                INSERT INTO branch_messages (id, branch_id, log_id, sequence)
+                VALUES (?, ?, ?, ?)
+            """, [
+                (str(ulid.ULID()), branch_id, msg["id"], i)
+                for i, msg in enumerate(branch_messages)
+            ])
 
             conn.commit()
         finally:
@@ -148,12 +166,7 @@ class BranchManager:
         if not row:
             return None
 
-        branch = dict(row)
-
-        # Get message count
-        branch["message_count"] = self._get_branch_message_count(branch["id"])
-
-        return branch
+        return dict(row)
 
     def list_branches(self, conversation_id: str, include_inactive: bool = False) -> List[Dict[str, Any]]:
         """List all branches for a conversation."""
@@ -172,12 +185,7 @@ class BranchManager:
         query += " ORDER BY created_at DESC"
 
         cursor = conn.execute(query, params)
-        branches = []
-
-        for row in cursor.fetchall():
-            branch = dict(row)
-            branch["message_count"] = self._get_branch_message_count(branch["id"])
-            branches.append(branch)
+        branches = [dict(row) for row in cursor.fetchall()]
 
         conn.close()
 
@@ -331,20 +339,6 @@ class BranchManager:
         branch = self.get_branch(conversation_id, branch_name)
         return branch["id"] if branch else None
 
-    def _get_branch_message_count(self, branch_id: str) -> int:
-        """Get count of messages in a branch."""
-        conn = sqlite3.connect(str(self.db_path))
-
-        cursor = conn.execute("""
-            SELECT COUNT(*) as count FROM branch_messages
-            WHERE branch_id = ?
-        """, (branch_id,))
-
-        count = cursor.fetchone()[0]
-        conn.close()
-
-        return count
-
     def _has_child_branches(self, branch_id: str) -> bool:
         """Check if a branch has children."""
         conn = sqlite3.connect(str(self.db_path))
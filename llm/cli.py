@@ -1,7 +1,13 @@
 import asyncio
+import atexit
 import click
 from click_default_group import DefaultGroup
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import copy
 from dataclasses import asdict
+import fnmatch
+from functools import lru_cache
 import io
 import json
 import os
@@ -45,10 +51,10 @@ from llm.models import _BaseConversation, ChainResponse
 from .migrations import migrate
 from .plugins import pm, load_plugins
 from .utils import (
-    ensure_fragment,
     extract_fenced_code_block,
     find_unused_key,
     has_plugin_prefix,
+    insert_fragment,
     instantiate_from_spec,
     make_schema_id,
     maybe_fenced_code,
@@ -68,8 +74,6 @@ import inspect
 import pathlib
 import pydantic
 import re
-import readline
-from runpy import run_module
 import shutil
 import sqlite_utils
 from sqlite_utils.utils import rows_from_file, Format
@@ -83,6 +87,40 @@ warnings.simplefilter("ignore", ResourceWarning)
 
 DEFAULT_TEMPLATE = "prompt: "
 
+# Matches the start of every line containing non-whitespace, mirroring the
+# default predicate used by textwrap.indent()
+_INDENT_RE = re.compile(r"(?m)^(?=[^\n]*\S)")
+
+
+def _indent(text: str, prefix: str = "    ") -> str:
+    "Faster equivalent of textwrap.indent() for large blocks of text"
+    return _INDENT_RE.sub(prefix, text)
+
+
+@lru_cache(maxsize=1)
+def _http_client() -> httpx.Client:
+    """
+    Shared HTTP client for fetching URL fragments and templates
+
+    Reusing one client keeps connections alive between requests to the same
+    host, instead of paying for a new TCP and TLS handshake every time.
+    """
+    client = httpx.Client(max_redirects=3)
+    atexit.register(client.close)
+    return client
+
+
+class _LiteralStrDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):  # type: ignore
+    "YAML dumper that uses the literal block style for multi-line strings"
+
+
+_LiteralStrDumper.add_representer(
+    str,
+    lambda dumper, data: dumper.represent_scalar(
+        "tag:yaml.org,2002:str", data, style="|" if "\n" in data else None
+    ),
+)
+
 
 class FragmentNotFound(Exception):
     pass
@@ -94,6 +132,10 @@ def validate_fragment_alias(ctx, param, value):
     return value
 
 
+def validate_fragment_aliases(ctx, param, values):
+    return tuple(validate_fragment_alias(ctx, param, value) for value in values)
+
+
 def resolve_fragments(
     db: sqlite_utils.Database, fragments: Iterable[str], allow_attachments: bool = False
 ) -> List[Union[Fragment, Attachment]]:
@@ -121,8 +163,7 @@ def resolve_fragments(
     resolved: List[Union[Fragment, Attachment]] = []
     for fragment in fragments:
         if fragment.startswith("http://") or fragment.startswith("https://"):
-            client = httpx.Client(follow_redirects=True, max_redirects=3)
-            response = client.get(fragment)
+            response = _http_client().get(fragment, follow_redirects=True)
             response.raise_for_status()
             resolved.append(Fragment(response.text, fragment))
         elif fragment == "-":
@@ -1036,6 +1077,8 @@ def chat(
     """
     Hold an ongoing chat with a model.
     """
+    import readline
+
     # Left and right arrow keys to move cursor:
     if sys.platform != "win32":
         readline.parse_and_bind("\\e[D: backward-char")
@@ -1335,15 +1378,15 @@ def keys_set(name, value):
     default = {"// Note": "This file stores secret API credentials. Do not share!"}
     path = user_dir() / "keys.json"
     path.parent.mkdir(parents=True, exist_ok=True)
-    if not path.exists():
-        path.write_text(json.dumps(default))
-        path.chmod(0o600)
     try:
         current = json.loads(path.read_text())
-    except json.decoder.JSONDecodeError:
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
         current = default
     current[name] = value
-    path.write_text(json.dumps(current, indent=2) + "\n")
+    # Written atomically so a failed write cannot lose existing keys
+    _atomic_write(
+        path, (json.dumps(current, indent=2) + "\n").encode("utf-8"), mode=0o600
+    )
 
 
 @cli.group(
@@ -2122,7 +2165,7 @@ def logs_list(
                         "- **{}**: `{}`<br>\n{}{}{}".format(
                             tool_result["name"],
                             tool_result["tool_call_id"],
-                            textwrap.indent(tool_result["output"], "    "),
+                            _indent(tool_result["output"]),
                             (
                                 "<br>\n    **Error**: {}\n".format(
                                     tool_result["exception"]
@@ -2405,7 +2448,7 @@ def templates_loaders():
         if loader.__doc__:
             docs = textwrap.dedent(loader.__doc__).strip()
         click.echo(f"{prefix}:")
-        click.echo(textwrap.indent(docs, "  "))
+        click.echo(_indent(docs, "  "))
     if not found:
         click.echo("No template loaders found")
 
@@ -2801,8 +2844,7 @@ def fragments():
 @click.option("json_", "--json", is_flag=True, help="Output as JSON")
 def fragments_list(queries, aliases, json_):
     "List current fragments"
-    db = sqlite_utils.Database(logs_db_path())
-    migrate(db)
+    db = _open_db(str(logs_db_path()))
     params = {}
     param_count = 0
     where_bits = []
@@ -2822,6 +2864,15 @@ def fragments_list(queries, aliases, json_):
     where = "\n      and\n  ".join(where_bits)
     if where:
         where = " where " + where
+    stdout = click.get_text_stream("stdout")
+    # Content is only truncated for display in a terminal - when piped to
+    # another program or a file the full content is output instead
+    truncate = not json_ and stdout.isatty()
+    content = "fragments.content"
+    if truncate:
+        # Only fetch enough content for truncate_string() to do its job
+        content = "substr(fragments.content, 1, :content_length)"
+        params["content_length"] = 101
     sql = """
     select
         fragments.hash,
@@ -2831,7 +2882,7 @@ def fragments_list(queries, aliases, json_):
         ) as aliases,
         fragments.datetime_utc,
         fragments.source,
-        fragments.content
+        {content} as content
     from
         fragments
     left join
@@ -2841,23 +2892,35 @@ def fragments_list(queries, aliases, json_):
         fragments.id, fragments.hash, fragments.content, fragments.datetime_utc, fragments.source
     order by fragments.datetime_utc
     """.format(
-        where=where
+        where=where, content=content
     )
-    results = list(db.query(sql, params))
-    for result in results:
+    # Stream rows straight from the cursor rather than materializing them all
+    first = True
+    for result in db.query(sql, params):
         result["aliases"] = json.loads(result["aliases"])
+        if json_:
+            # Reproduces the framing of json.dumps(results, indent=4)
+            click.echo(
+                ("[\n" if first else ",\n") + _indent(json.dumps(result, indent=4)),
+                nl=False,
+            )
+        else:
+            if truncate:
+                result["content"] = truncate_string(result["content"])
+            # Each row is a one-item list, so the concatenated output is a
+            # single YAML sequence. Writing to the stream directly avoids
+            # building, stripping and copying an intermediate string.
+            yaml.dump(
+                [result],
+                stdout,
+                Dumper=_LiteralStrDumper,
+                sort_keys=False,
+                # The libyaml emitter rejects sys.maxsize
+                width=2**31 - 1,
+            )
+        first = False
     if json_:
-        click.echo(json.dumps(results, indent=4))
-    else:
-        yaml.add_representer(
-            str,
-            lambda dumper, data: dumper.represent_scalar(
-                "tag:yaml.org,2002:str", data, style="|" if "\n" in data else None
-            ),
-        )
-        for result in results:
-            result["content"] = truncate_string(result["content"])
-            click.echo(yaml.dump([result], sort_keys=False, width=sys.maxsize).strip())
+        click.echo("[]" if first else "\n]")
 
 
 @fragments.command(name="set")
@@ -2874,21 +2937,22 @@ def fragments_set(alias, fragment):
     \b
         llm fragments set mydocs ./docs.md
     """
-    db = sqlite_utils.Database(logs_db_path())
-    migrate(db)
+    db = _open_db(str(logs_db_path()))
     try:
         resolved = resolve_fragments(db, [fragment])[0]
     except FragmentNotFound as ex:
         raise click.ClickException(str(ex))
-    migrate(db)
     alias_sql = """
     insert into fragment_aliases (alias, fragment_id)
     values (:alias, :fragment_id)
     on conflict(alias) do update set
         fragment_id = excluded.fragment_id;
     """
+    # Store the fragment and its alias in a single transaction. sqlite3 opens
+    # it implicitly at the first insert, so this also works if the shared
+    # connection is already inside a transaction
     with db.conn:
-        fragment_id = ensure_fragment(db, resolved)
+        fragment_id = insert_fragment(db, resolved)
         db.conn.execute(alias_sql, {"alias": alias, "fragment_id": fragment_id})
 
 
@@ -2901,8 +2965,7 @@ def fragments_show(alias_or_hash):
     \b
         llm fragments show mydocs
     """
-    db = sqlite_utils.Database(logs_db_path())
-    migrate(db)
+    db = _open_db(str(logs_db_path()))
     try:
         resolved = resolve_fragments(db, [alias_or_hash])[0]
     except FragmentNotFound as ex:
@@ -2911,21 +2974,22 @@ def fragments_show(alias_or_hash):
 
 
 @fragments.command(name="remove")
-@click.argument("alias", callback=validate_fragment_alias)
-def fragments_remove(alias):
+@click.argument("aliases", nargs=-1, required=True, callback=validate_fragment_aliases)
+def fragments_remove(aliases):
     """
-    Remove a fragment alias
+    Remove one or more fragment aliases
 
     Example usage:
 
     \b
         llm fragments remove docs
+        llm fragments remove docs notes
     """
-    db = sqlite_utils.Database(logs_db_path())
-    migrate(db)
+    db = _open_db(str(logs_db_path()))
     with db.conn:
-        db.conn.execute(
-            "delete from fragment_aliases where alias = :alias", {"alias": alias}
+        db.conn.executemany(
+            "delete from fragment_aliases where alias = ?",
+            [(alias,) for alias in aliases],
         )
 
 
@@ -2944,7 +3008,7 @@ def fragments_loaders():
         if loader.__doc__:
             docs = textwrap.dedent(loader.__doc__).strip()
         click.echo(f"{prefix}:")
-        click.echo(textwrap.indent(docs, "  "))
+        click.echo(_indent(docs, "  "))
     if not found:
         click.echo("No fragment loaders found")
 
@@ -2959,7 +3023,9 @@ def plugins_list(all, hooks):
     plugins = get_plugins(all)
     hooks = set(hooks)
     if hooks:
-        plugins = [plugin for plugin in plugins if hooks.intersection(plugin["hooks"])]
+        plugins = [
+            plugin for plugin in plugins if not hooks.isdisjoint(plugin["hooks"])
+        ]
     click.echo(json.dumps(plugins, indent=2))
 
 
@@ -3011,6 +3077,8 @@ def install(packages, upgrade, editable, force_reinstall, no_cache_dir, pre):
         args += ["--pre"]
     args += list(packages)
     sys.argv = args
+    from runpy import run_module
+
     run_module("pip", run_name="__main__")
 
 
@@ -3020,6 +3088,8 @@ def install(packages, upgrade, editable, force_reinstall, no_cache_dir, pre):
 def uninstall(packages, yes):
     """Uninstall Python packages from the LLM environment"""
     sys.argv = ["pip", "uninstall"] + list(packages) + (["-y"] if yes else [])
+    from runpy import run_module
+
     run_module("pip", run_name="__main__")
 
 
@@ -3112,14 +3182,7 @@ def embed(
 
     # Resolve input text
     if not content:
-        if not input or input == "-":
-            # Read from stdin
-            input_source = sys.stdin.buffer if binary else sys.stdin
-            content = input_source.read()
-        else:
-            mode = "rb" if binary else "r"
-            with open(input, mode) as f:
-                content = f.read()
+        content = _read_input(input, binary)
 
     if not content:
         raise click.ClickException("No content provided")
@@ -3166,6 +3229,9 @@ def embed(
 )
 @click.option("--binary", is_flag=True, help="Treat --files as binary data")
 @click.option("--sql", help="Read input using this SQL query")
+@click.option(
+    "count_", "--count", is_flag=True, help="Count --sql rows first to show progress"
+)
 @click.option(
     "--attach",
     type=(str, click.Path(file_okay=True, dir_okay=False, allow_dash=False)),
@@ -3198,6 +3264,7 @@ def embed_multi(
     encodings,
     binary,
     sql,
+    count_,
     attach,
     batch_size,
     prefix,
@@ -3278,67 +3345,82 @@ def embed_multi(
     if files:
         encodings = encodings or ("utf-8", "latin-1")
 
-        def count_files():
-            i = 0
-            for directory, pattern in files:
-                for path in pathlib.Path(directory).glob(pattern):
-                    i += 1
-            return i
-
-        def iterate_files():
+        def find_files():
             for directory, pattern in files:
                 p = pathlib.Path(directory)
                 if not p.exists() or not p.is_dir():
                     # fixes issue/274 - raise error if directory does not exist
                     raise click.UsageError(f"Invalid directory: {directory}")
-                for path in pathlib.Path(directory).glob(pattern):
+                if "/" not in pattern and "**" not in pattern:
+                    # Flat patterns: DirEntry.is_file() avoids an extra stat()
+                    with os.scandir(p) as entries:
+                        for entry in entries:
+                            # fnmatch() applies os.path.normcase(), so this
+                            # is case-insensitive where Path.glob() would be
+                            if entry.is_file() and fnmatch.fnmatch(
+                                entry.name, pattern
+                            ):
+                                yield directory, p / entry.name
+                    continue
+                for path in p.glob(pattern):
                     if path.is_dir():
                         continue  # fixed issue/280 - skip directories
-                    relative = path.relative_to(directory)
-                    content = None
-                    if binary:
-                        content = path.read_bytes()
-                    else:
-                        for encoding in encodings:
-                            try:
-                                content = path.read_text(encoding=encoding)
-                            except UnicodeDecodeError:
-                                continue
-                    if content is None:
-                        # Log to stderr
-                        click.echo(
-                            "Could not decode text in file {}".format(path),
-                            err=True,
-                        )
-                    else:
-                        yield {"id": str(relative), "content": content}
+                    yield directory, path
+
+        # Walk the directories once, for both the count and the iteration
+        file_paths = list(find_files())
+
+        def iterate_files():
+            for directory, path in file_paths:
+                relative = path.relative_to(directory)
+                content = None
+                if binary:
+                    content = path.read_bytes()
+                else:
+                    for encoding in encodings:
+                        try:
+                            content = path.read_text(encoding=encoding)
+                        except UnicodeDecodeError:
+                            continue
+                if content is None:
+                    # Log to stderr
+                    click.echo(
+                        "Could not decode text in file {}".format(path),
+                        err=True,
+                    )
+                else:
+                    yield {"id": str(relative), "content": content}
 
-        expected_length = count_files()
+        expected_length = len(file_paths)
         rows = iterate_files()
     elif sql:
         rows = db.query(sql)
-        count_sql = "select count(*) as c from ({})".format(sql)
-        expected_length = next(db.query(count_sql))["c"]
+        if count_:
+            # This runs the full query an extra time, so it is opt-in
+            count_sql = "select count(*) as c from ({})".format(sql)
+            expected_length = next(db.query(count_sql))["c"]
     else:
-
-        def load_rows(fp):
-            return rows_from_file(fp, Format[format.upper()] if format else None)[0]
-
         try:
-            if input_path != "-":
-                # Read the file twice - first time is to get a count
-                expected_length = 0
-                with open(input_path, "rb") as fp:
-                    for _ in load_rows(fp):
-                        expected_length += 1
-
-            rows = load_rows(
-                open(input_path, "rb")
-                if input_path != "-"
-                else io.BufferedReader(sys.stdin.buffer)
+            rows, detected_format = rows_from_file(
+                (
+                    open(input_path, "rb")
+                    if input_path != "-"
+                    else io.BufferedReader(sys.stdin.buffer)
+                ),
+                Format[format.upper()] if format else None,
             )
         except json.JSONDecodeError as ex:
             raise click.ClickException(str(ex))
+        if isinstance(rows, list):
+            # JSON arrays are parsed up front, so the count is free
+            expected_length = len(rows)
+        elif input_path != "-":
+            # Count lines rather than parsing the whole file a second time
+            with open(input_path, "rb") as fp:
+                expected_length = sum(1 for line in fp if line.strip())
+            if detected_format in (Format.CSV, Format.TSV):
+                # Skip the header row
+                expected_length = max(expected_length - 1, 0)
 
     with click.progressbar(
         rows, label="Embedding", show_percent=True, length=expected_length
@@ -3360,7 +3442,11 @@ def embed_multi(
         embed_kwargs = {"store": store}
         if batch_size:
             embed_kwargs["batch_size"] = batch_size
-        collection_obj.embed_multi(tuples(), **embed_kwargs)
+        try:
+            collection_obj.embed_multi(tuples(), **embed_kwargs)
+        except json.JSONDecodeError as ex:
+            # Newline-delimited JSON is only parsed as rows are consumed
+            raise click.ClickException(str(ex))
 
 
 @cli.command()
@@ -3423,14 +3509,7 @@ def similar(collection, id, input, content, binary, number, plain, database, pre
     else:
         # Resolve input text
         if not content:
-            if not input or input == "-":
-                # Read from stdin
-                input_source = sys.stdin.buffer if binary else sys.stdin
-                content = input_source.read()
-            else:
-                mode = "rb" if binary else "r"
-                with open(input, mode) as f:
-                    content = f.read()
+            content = _read_input(input, binary)
         if not content:
             raise click.ClickException("No content provided")
         results = collection_obj.similar(content, number, prefix=prefix)
@@ -3706,9 +3785,9 @@ def options_clear(model, key):
 
     cleared_keys = []
     if not key:
-        cleared_keys = list(get_model_options(model_id).keys())
-        for key_ in cleared_keys:
-            clear_model_option(model_id, key_)
+        # Clear every option for the model with a single write
+        with _model_options_txn() as all_options:
+            cleared_keys = list(all_options.pop(model_id, {}).keys())
     else:
         cleared_keys.append(key)
         clear_model_option(model_id, key)
@@ -3731,12 +3810,26 @@ def logs_db_path():
     return user_dir() / "logs.db"
 
 
+@lru_cache(maxsize=8)
+def _open_db(path: str) -> sqlite_utils.Database:
+    """
+    Open and migrate the logs database at this path, once per process
+
+    Subsequent calls for the same path reuse the connection and skip the
+    schema introspection performed by migrate().
+    """
+    db = sqlite_utils.Database(path)
+    db.conn.execute("PRAGMA journal_mode=WAL")
+    db.conn.execute("PRAGMA synchronous=NORMAL")
+    db.conn.execute("PRAGMA temp_store=MEMORY")
+    migrate(db)
+    return db
+
+
 def get_history(chat_id):
     if chat_id is None:
         return None, []
-    log_path = logs_db_path()
-    db = sqlite_utils.Database(log_path)
-    migrate(db)
+    db = _open_db(str(logs_db_path()))
     if chat_id == -1:
         # Return the most recent chat
         last_row = list(db["logs"].rows_where(order_by="-id", limit=1))
@@ -3768,35 +3861,66 @@ def _human_readable_size(size_bytes):
         return "0B"
 
     size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = 0
+    # Each unit is 2**10 times the previous one, so the index is log2 // 10
+    i = min((int(size_bytes).bit_length() - 1) // 10, len(size_name) - 1)
+    return "{:.2f}{}".format(size_bytes / (1 << (10 * i)), size_name[i])
+
 
-    while size_bytes >= 1024 and i < len(size_name) - 1:
-        size_bytes /= 1024.0
-        i += 1
+def _read_input(input: Optional[str], binary: bool) -> Union[str, bytes]:
+    """
+    Read content to embed from a file path, or from stdin if input is - or None
 
-    return "{:.2f}{}".format(size_bytes, size_name[i])
+    A single .read() holds only one copy of the content. Text input goes
+    through the usual text layer for decoding and newlines.
+    """
+    if not input or input == "-":
+        # Read from stdin
+        input_source = sys.stdin.buffer if binary else sys.stdin
+        return input_source.read()
+    mode = "rb" if binary else "r"
+    with open(input, mode) as f:
+        return f.read()
 
 
 def logs_on():
     return not (user_dir() / "logs-off").exists()
 
 
-def get_all_model_options() -> dict:
+# Parsed model_options.json files, keyed on path -> (mtime_ns, size, options)
+_model_options_cache: Dict[str, Tuple[int, int, dict]] = {}
+
+
+def _load_model_options(path: pathlib.Path) -> dict:
     """
-    Get all default options for all models
+    Return the parsed contents of model_options.json, cached on mtime and size
+
+    The returned dictionary is shared between calls and must not be mutated.
     """
-    path = user_dir() / "model_options.json"
-    if not path.exists():
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
         return {}
-
+    cached = _model_options_cache.get(str(path))
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
     try:
         options = json.loads(path.read_text())
     except json.JSONDecodeError:
-        return {}
-
+        options = {}
+    if not isinstance(options, dict):
+        options = {}
+    _model_options_cache[str(path)] = (stat.st_mtime_ns, stat.st_size, options)
     return options
 
 
+def get_all_model_options() -> dict:
+    """
+    Get all default options for all models
+    """
+    options = _load_model_options(user_dir() / "model_options.json")
+    return {model_id: dict(values) for model_id, values in options.items()}
+
+
 def get_model_options(model_id: str) -> dict:
     """
     Get default options for a specific model
@@ -3807,16 +3931,45 @@ def get_model_options(model_id: str) -> dict:
     Returns:
         A dictionary of model options
     """
-    path = user_dir() / "model_options.json"
-    if not path.exists():
-        return {}
+    options = _load_model_options(user_dir() / "model_options.json")
+    return dict(options.get(model_id, {}))
+
+
+def _atomic_write(path: pathlib.Path, data: bytes, mode: int = 0o666) -> None:
+    """
+    Replace the contents of path with data atomically
+
+    The data is written to a temporary file with a single write() and then
+    renamed over path, so a crash can never leave a partially written file.
+    """
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    # Remove any stale temporary file, so mode is applied when it is created
+    tmp_path.unlink(missing_ok=True)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(data)
+    os.replace(tmp_path, path)
 
-    try:
-        options = json.loads(path.read_text())
-    except json.JSONDecodeError:
-        return {}
 
-    return options.get(model_id, {})
+def _write_model_options(path: pathlib.Path, options: dict) -> None:
+    _atomic_write(path, json.dumps(options, indent=2).encode("utf-8"))
+    # Cache what was just written, so the next read does not parse it again
+    stat = path.stat()
+    _model_options_cache[str(path)] = (stat.st_mtime_ns, stat.st_size, options)
+
+
+@contextmanager
+def _model_options_txn():
+    """
+    Yield all model options as a mutable dictionary, then write them back
+    to model_options.json once on exit - only if they were modified
+    """
+    path = user_dir() / "model_options.json"
+    options = get_all_model_options()
+    original = {model_id: dict(values) for model_id, values in options.items()}
+    yield options
+    if options != original:
+        _write_model_options(path, options)
 
 
 def set_model_option(model_id: str, key: str, value: Any) -> None:
@@ -3828,24 +3981,19 @@ def set_model_option(model_id: str, key: str, value: Any) -> None:
         key: The option key
         value: The option value
     """
-    path = user_dir() / "model_options.json"
-    if path.exists():
-        try:
-            options = json.loads(path.read_text())
-        except json.JSONDecodeError:
-            options = {}
-    else:
-        options = {}
+    _set_model_options([(model_id, key, value)])
 
-    # Ensure the model has an entry
-    if model_id not in options:
-        options[model_id] = {}
 
-    # Set the option
-    options[model_id][key] = value
+def _set_model_options(changes: Iterable[Tuple[str, str, Any]]) -> None:
+    """
+    Set several default options, writing model_options.json only once
 
-    # Save the options
-    path.write_text(json.dumps(options, indent=2))
+    Args:
+        changes: (model_id, key, value) tuples to apply in order
+    """
+    with _model_options_txn() as options:
+        for model_id, key, value in changes:
+            options.setdefault(model_id, {})[key] = value
 
 
 def clear_model_option(model_id: str, key: str) -> None:
@@ -3856,35 +4004,58 @@ def clear_model_option(model_id: str, key: str) -> None:
         model_id: The model ID
         key: Key to clear
     """
-    path = user_dir() / "model_options.json"
-    if not path.exists():
-        return
-
-    try:
-        options = json.loads(path.read_text())
-    except json.JSONDecodeError:
-        return
-
-    if model_id not in options:
+    # Checked against the cached options first, so clearing an option that
+    # is not set neither copies the options nor rewrites the file
+    if key not in _load_model_options(user_dir() / "model_options.json").get(
+        model_id, {}
+    ):
         return
-
-    if key in options[model_id]:
+    with _model_options_txn() as options:
         del options[model_id][key]
         if not options[model_id]:
             del options[model_id]
 
-    path.write_text(json.dumps(options, indent=2))
-
 
 class LoadTemplateError(ValueError):
     pass
 
 
-def _parse_yaml_template(name, content):
+def _load_yaml(content):
     try:
-        loaded = yaml.safe_load(content)
+        return yaml.safe_load(content)
     except yaml.YAMLError as ex:
         raise LoadTemplateError("Invalid YAML: {}".format(str(ex)))
+
+
+def _parse_yaml_template(name, content):
+    return _template_from_loaded(name, _load_yaml(content))
+
+
+# Parsed template files, keyed on path -> (mtime_ns, size, loaded YAML)
+_template_yaml_cache: Dict[str, Tuple[int, int, Any]] = {}
+_TEMPLATE_YAML_CACHE_SIZE = 256
+
+
+def _load_template_file(path: pathlib.Path) -> Any:
+    """
+    Return the parsed YAML of a template file, cached on its mtime and size
+
+    A deep copy is returned so callers can modify it without affecting the cache.
+    """
+    stat = path.stat()
+    key = str(path)
+    cached = _template_yaml_cache.get(key)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return copy.deepcopy(cached[2])
+    loaded = _load_yaml(path.read_text())
+    if len(_template_yaml_cache) >= _TEMPLATE_YAML_CACHE_SIZE:
+        # Evict the oldest entry
+        del _template_yaml_cache[next(iter(_template_yaml_cache))]
+    _template_yaml_cache[key] = (stat.st_mtime_ns, stat.st_size, loaded)
+    return copy.deepcopy(loaded)
+
+
+def _template_from_loaded(name, loaded):
     if isinstance(loaded, str):
         return Template(name=name, prompt=loaded)
     loaded["name"] = name
@@ -3899,7 +4070,7 @@ def _parse_yaml_template(name, content):
 def load_template(name: str) -> Template:
     "Load template, or raise LoadTemplateError(msg)"
     if name.startswith("https://") or name.startswith("http://"):
-        response = httpx.get(name)
+        response = _http_client().get(name)
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as ex:
@@ -3927,8 +4098,7 @@ def load_template(name: str) -> Template:
         path = template_dir() / f"{name}.yaml"
     if not path.exists():
         raise LoadTemplateError(f"Invalid template: {name}")
-    content = path.read_text()
-    template_obj = _parse_yaml_template(name, content)
+    template_obj = _template_from_loaded(name, _load_template_file(path))
     # We trust functions here because they came from the filesystem
     template_obj._functions_is_trusted = True
     return template_obj
@@ -3938,22 +4108,47 @@ def _tools_from_code(code_or_path: str) -> List[Tool]:
     """
     Treat all Python functions in the code as tools
     """
-    if "\n" not in code_or_path and code_or_path.endswith(".py"):
-        try:
-            code_or_path = pathlib.Path(code_or_path).read_text()
-        except FileNotFoundError:
-            raise click.ClickException("File not found: {}".format(code_or_path))
-    namespace: Dict[str, Any] = {}
-    tools = []
+    return _tools_from_compiled(_compile_tools(code_or_path))
+
+
+def _compile_tools(code_or_path: str):
+    "Return a compiled code object for --functions code or a path to a .py file"
     try:
-        exec(code_or_path, namespace)
+        if "\n" not in code_or_path and code_or_path.endswith(".py"):
+            try:
+                stat = os.stat(code_or_path)
+            except FileNotFoundError:
+                raise click.ClickException("File not found: {}".format(code_or_path))
+            return _compile_tools_file(code_or_path, stat.st_mtime_ns, stat.st_size)
+        else:
+            return _compile_tools_code(code_or_path)
     except SyntaxError as ex:
         raise click.ClickException("Error in --functions definition: {}".format(ex))
+
+
+def _tools_from_compiled(code) -> List[Tool]:
+    namespace: Dict[str, Any] = {}
+    exec(code, namespace)
     # Register all callables in the locals dict:
-    for name, value in namespace.items():
-        if callable(value) and not name.startswith("_"):
-            tools.append(Tool.function(value))
-    return tools
+    return [
+        Tool.function(value)
+        for name, value in namespace.items()
+        if callable(value) and not name.startswith("_")
+    ]
+
+
+# Compiled code objects are cached, so the same --functions code is only
+# parsed once per process. optimize=2 is deliberately not used here, as it
+# would strip the docstrings that become the tool descriptions.
+@lru_cache(maxsize=64)
+def _compile_tools_code(code: str):
+    return compile(code, "<string>", "exec")
+
+
+@lru_cache(maxsize=64)
+def _compile_tools_file(path: str, mtime_ns: int, size: int):
+    # mtime_ns and size are part of the cache key so edits are picked up
+    return compile(pathlib.Path(path).read_text(), path, "exec")
 
 
 def _debug_tool_call(_, tool_call, tool_result):
@@ -3965,17 +4160,20 @@ def _debug_tool_call(_, tool_call, tool_result):
         ),
         err=True,
     )
-    output = ""
     attachments = ""
     if tool_result.attachments:
         attachments += "\nAttachments:\n"
         for attachment in tool_result.attachments:
             attachments += f"  {repr(attachment)}\n"
 
-    try:
-        output = json.dumps(json.loads(tool_result.output), indent=2)
-    except ValueError:
-        output = tool_result.output
+    output = tool_result.output
+    # Output that already starts with an indented object or array is shown
+    # as-is, skipping the parse and re-serialize roundtrip
+    if not output.startswith(("{\n", "[\n")):
+        try:
+            output = json.dumps(json.loads(output), indent=2)
+        except ValueError:
+            pass
     output += attachments
     click.echo(
         click.style(
@@ -4013,19 +4211,27 @@ def _gather_tools(
     tool_specs: List[str], python_tools: List[str]
 ) -> List[Union[Tool, Type[Toolbox]]]:
     tools: List[Union[Tool, Type[Toolbox]]] = []
-    if python_tools:
-        for code_or_path in python_tools:
-            tools.extend(_tools_from_code(code_or_path))
+    if len(python_tools) > 1:
+        # Read and compile several --functions files concurrently. The code
+        # itself is then executed in order on this thread, as it may have
+        # side effects that are only safe on the main thread.
+        with ThreadPoolExecutor(max_workers=min(8, len(python_tools))) as executor:
+            for code in executor.map(_compile_tools, python_tools):
+                tools.extend(_tools_from_compiled(code))
+    elif python_tools:
+        tools.extend(_tools_from_code(python_tools[0]))
     registered_tools = get_tools()
     registered_classes = dict(
         (key, value)
         for key, value in registered_tools.items()
         if inspect.isclass(value)
     )
-    bad_tools = [
-        tool for tool in tool_specs if tool.split("(")[0] not in registered_tools
-    ]
-    if bad_tools:
+    # A single set difference in the common case where every tool exists
+    missing = {
+        tool.partition("(")[0] for tool in tool_specs
+    } - registered_tools.keys()
+    if missing:
+        bad_tools = [tool for tool in tool_specs if tool.partition("(")[0] in missing]
         raise click.ClickException(
             "Tool(s) {} not found. Available tools: {}".format(
                 ", ".join(bad_tools), ", ".join(registered_tools.keys())
@@ -4050,6 +4256,26 @@ def _get_conversation_tools(conversation, tools):
             return [tool.name for tool in initial_tools if tool.plugin]
 
 # Prompt Library Commands
+_PROMPT_VAR_RE = re.compile(r"\{(\w+)\}")
+
+
+@lru_cache(maxsize=8)
+def _cached_prompt_library(db_path: str):
+    from llm.prompt_library import PromptLibrary
+
+    return PromptLibrary(pathlib.Path(db_path))
+
+
+def _prompt_library():
+    """
+    Return the PromptLibrary for the current user directory
+
+    The instance is reused within a process, so the schema setup in
+    PromptLibrary.__init__ only runs once per database path.
+    """
+    return _cached_prompt_library(str(user_dir() / "prompts.db"))
+
+
 @cli.group(name="prompts")
 def prompts_group():
     """Manage prompt library - save, organize and reuse prompts"""
@@ -4067,14 +4293,13 @@ def prompts_group():
 @click.option("--file", "prompt_file", type=click.File('r'), help="Load prompt from file")
 def prompts_add(name, prompt, system_prompt, description, category, tags, model, prompt_file):
     """Add a new prompt to the library"""
-    from llm.prompt_library import PromptLibrary
     
     if prompt_file:
         prompt = prompt_file.read()
     
     tags_list = [t.strip() for t in tags.split(",")] if tags else None
     
-    library = PromptLibrary()
+    library = _prompt_library()
     try:
         prompt_id = library.add_prompt(
             name=name,
@@ -4098,11 +4323,7 @@ def prompts_add(name, prompt, system_prompt, description, category, tags, model,
 @click.option("--format", "output_format", type=click.Choice(["table", "json", "yaml"]), default="table")
 def prompts_list(category, tag, author, limit, output_format):
     """List saved prompts"""
-    from llm.prompt_library import PromptLibrary
-    import json
-    import yaml
-    
-    library = PromptLibrary()
+    library = _prompt_library()
     prompts = library.list_prompts(category=category, tag=tag, author=author, limit=limit)
     
     if output_format == "json":
@@ -4115,47 +4336,54 @@ def prompts_list(category, tag, author, limit, output_format):
             click.echo("No prompts found")
             return
         
-        click.echo(f"\nPrompt Library ({len(prompts)} prompts)\n")
-        click.echo(f"{'Name':<20} {'Category':<15} {'Tags':<30} {'Used':<8}")
-        click.echo("=" * 80)
+        # Build the whole table and write it with a single echo
+        lines = [
+            f"\nPrompt Library ({len(prompts)} prompts)\n",
+            f"{'Name':<20} {'Category':<15} {'Tags':<30} {'Used':<8}",
+            "=" * 80,
+        ]
         for p in prompts:
             tags_str = ", ".join(p.get('tags') or [])[:28]
-            click.echo(f"{p['name']:<20} {(p.get('category') or ''):<15} {tags_str:<30} {p['usage_count']:<8}")
+            lines.append(f"{p['name']:<20} {(p.get('category') or ''):<15} {tags_str:<30} {p['usage_count']:<8}")
+        click.echo("\n".join(lines))
+
+
+_PROMPT_SHOW_FIELDS = (
+    ("Description", "description", str),
+    ("Category", "category", str),
+    ("Tags", "tags", ", ".join),
+    ("Model", "model", str),
+)
 
 
 @prompts_group.command(name="show")
 @click.argument("name")
 def prompts_show(name):
     """Show details of a prompt"""
-    from llm.prompt_library import PromptLibrary
     
-    library = PromptLibrary()
+    library = _prompt_library()
     prompt = library.get_prompt(name)
     
     if not prompt:
         raise click.ClickException(f"Prompt '{name}' not found")
     
-    click.echo(f"\nPrompt: {prompt['name']}")
-    click.echo("=" * 60)
-    if prompt.get('description'):
-        click.echo(f"Description: {prompt['description']}")
-    if prompt.get('category'):
-        click.echo(f"Category: {prompt['category']}")
-    if prompt.get('tags'):
-        click.echo(f"Tags: {', '.join(prompt['tags'])}")
-    if prompt.get('model'):
-        click.echo(f"Model: {prompt['model']}")
-    click.echo(f"Created: {prompt['created_at']}")
-    click.echo(f"Used: {prompt['usage_count']} times")
-    
-    click.echo(f"\nPrompt Template:")
-    click.echo("-" * 60)
-    click.echo(prompt['prompt'])
-    
+    lines = [f"\nPrompt: {prompt['name']}", "=" * 60]
+    # Optional fields are only shown if they have a value
+    lines.extend(
+        f"{label}: {format_value(value)}"
+        for label, key, format_value in _PROMPT_SHOW_FIELDS
+        if (value := prompt.get(key))
+    )
+    lines.extend([
+        f"Created: {prompt['created_at']}",
+        f"Used: {prompt['usage_count']} times",
+        "\nPrompt Template:",
+        "-" * 60,
+        prompt['prompt'],
+    ])
     if prompt.get('system_prompt'):
-        click.echo(f"\nSystem Prompt:")
-        click.echo("-" * 60)
-        click.echo(prompt['system_prompt'])
+        lines.extend(["\nSystem Prompt:", "-" * 60, prompt['system_prompt']])
+    click.echo("\n".join(lines))
 
 
 @prompts_group.command(name="use")
@@ -4165,12 +4393,7 @@ def prompts_show(name):
 @click.option("-m", "--model", help="Override default model")
 def prompts_use(name, variables, vars_file, model):
     """Use a saved prompt"""
-    from llm.prompt_library import PromptLibrary
-    import json
-    import yaml
-    import re
-    
-    library = PromptLibrary()
+    library = _prompt_library()
     prompt = library.get_prompt(name)
     
     if not prompt:
@@ -4186,20 +4409,26 @@ def prompts_use(name, variables, vars_file, model):
             var_dict = yaml.safe_load(content)
     
     for var in variables:
-        if '=' not in var:
+        key, sep, value = var.partition('=')
+        if not sep:
             raise click.ClickException(f"Variable must be in format key=value, got: {var}")
-        key, value = var.split('=', 1)
         var_dict[key] = value
     
-    # Substitute variables in prompt
-    prompt_text = prompt['prompt']
-    for key, value in var_dict.items():
-        prompt_text = prompt_text.replace(f"{{{key}}}", value)
-    
-    # Check for unsubstituted variables
-    unsubstituted = re.findall(r'\{(\w+)\}', prompt_text)
-    if unsubstituted:
-        raise click.ClickException(f"Missing variables: {', '.join(unsubstituted)}")
+    # Substitute variables and collect any missing ones in a single pass
+    missing = []
+
+    def substitute(match):
+        key = match.group(1)
+        if key in var_dict:
+            return str(var_dict[key])
+        missing.append(key)
+        return match.group(0)
+
+    prompt_text = _PROMPT_VAR_RE.sub(substitute, prompt['prompt'])
+    if missing:
+        raise click.ClickException(
+            f"Missing variables: {', '.join(dict.fromkeys(missing))}"
+        )
     
     # Execute the prompt
     from llm import get_model
@@ -4226,9 +4455,8 @@ def prompts_use(name, variables, vars_file, model):
 @click.option("--create-version", is_flag=True, help="Create new version instead of overwriting")
 def prompts_edit(name, prompt, system_prompt, description, category, tags, create_version):
     """Edit an existing prompt"""
-    from llm.prompt_library import PromptLibrary
     
-    library = PromptLibrary()
+    library = _prompt_library()
     tags_list = [t.strip() for t in tags.split(",")] if tags else None
     
     success = library.update_prompt(
@@ -4252,13 +4480,12 @@ def prompts_edit(name, prompt, system_prompt, description, category, tags, creat
 @click.option("--force", is_flag=True, help="Don't ask for confirmation")
 def prompts_delete(name, force):
     """Delete a prompt from the library"""
-    from llm.prompt_library import PromptLibrary
     
     if not force:
         if not click.confirm(f"Delete prompt '{name}'?"):
             return
     
-    library = PromptLibrary()
+    library = _prompt_library()
     success = library.delete_prompt(name)
     
     if success:
@@ -4271,9 +4498,8 @@ def prompts_delete(name, force):
 @click.argument("query")
 def prompts_search(query):
     """Search prompts by name or description"""
-    from llm.prompt_library import PromptLibrary
     
-    library = PromptLibrary()
+    library = _prompt_library()
     prompts = library.search_prompts(query)
     
     if not prompts:
@@ -4294,9 +4520,8 @@ def prompts_search(query):
 @click.option("--output", type=click.File('w'), help="Output file (default: stdout)")
 def prompts_export(name, output_format, output):
     """Export a prompt to YAML or JSON"""
-    from llm.prompt_library import PromptLibrary
     
-    library = PromptLibrary()
+    library = _prompt_library()
     exported = library.export_prompt(name, format=output_format)
     
     if not exported:
@@ -4315,9 +4540,8 @@ def prompts_export(name, output_format, output):
 @click.option("--overwrite", is_flag=True, help="Overwrite if exists")
 def prompts_import(source, input_format, overwrite):
     """Import a prompt from YAML or JSON file"""
-    from llm.prompt_library import PromptLibrary
     
-    library = PromptLibrary()
+    library = _prompt_library()
     data = source.read()
     
     try:
@@ -4440,16 +4664,18 @@ def costs_list_budgets(show_all):
         click.echo("No budgets set")
         return
     
-    click.echo(f"\nBudgets ({len(budgets)} total)\n")
-    click.echo(f"{'Name':<15} {'Amount':<12} {'Period':<10} {'Category':<15} {'Hard Limit'}")
-    click.echo("=" * 70)
-    
+    lines = [
+        f"\nBudgets ({len(budgets)} total)\n",
+        f"{'Name':<15} {'Amount':<12} {'Period':<10} {'Category':<15} {'Hard Limit'}",
+        "=" * 70,
+    ]
     for budget in budgets:
         hard_limit = "Yes" if budget['hard_limit'] else "No"
         category = budget['category']
         if budget['category_value']:
             category += f":{budget['category_value']}"
-        click.echo(f"{budget['name']:<15} ${budget['amount']:<11.2f} {budget['period']:<10} {category:<15} {hard_limit}")
+        lines.append(f"{budget['name']:<15} ${budget['amount']:<11.2f} {budget['period']:<10} {category:<15} {hard_limit}")
+    click.echo("\n".join(lines))
 
 
 @costs_group.command(name="delete-budget")
@@ -4480,8 +4706,7 @@ def costs_delete_budget(name, force):
 def costs_report(month, from_date, to_date, export_file):
     """Generate cost report"""
     from llm.cost_tracking import CostTracker
-    import json
-    
+
     tracker = CostTracker()
     
     if month:
@@ -4557,21 +4782,23 @@ def compare_list(limit):
     from llm.model_comparison import ModelComparison
     
     comparator = ModelComparison()
-    comparisons = comparator.list_comparisons(limit=limit)
+    comparisons = comparator.list_comparisons(limit=limit, include_results=False)
     
     if not comparisons:
         click.echo("No comparisons found")
         return
     
-    click.echo(f"\nRecent Comparisons ({len(comparisons)})\n")
-    click.echo(f"{'ID':<10} {'Date':<20} {'Models':<40} {'Prompt':<30}")
-    click.echo("=" * 105)
-    
+    lines = [
+        f"\nRecent Comparisons ({len(comparisons)})\n",
+        f"{'ID':<10} {'Date':<20} {'Models':<40} {'Prompt':<30}",
+        "=" * 105,
+    ]
     for comp in comparisons:
         models_str = ", ".join(comp['models'])[:38]
         prompt_str = comp['prompt'][:28]
         date_str = comp['created_at'][:19]
-        click.echo(f"{comp['id'][:8]:<10} {date_str:<20} {models_str:<40} {prompt_str:<30}")
+        lines.append(f"{comp['id'][:8]:<10} {date_str:<20} {models_str:<40} {prompt_str:<30}")
+    click.echo("\n".join(lines))
 
 
 @compare_group.command(name="show")
@@ -4627,7 +4854,16 @@ def batch_group():
 @click.option("-o", "--output", "output_file", type=click.Path(), help="Output file")
 @click.option("--rate-limit", type=int, help="Maximum prompts per minute")
 @click.option("--max-prompts", type=int, help="Maximum number of prompts to process")
-def batch_run(input_file, model, template, system, output_file, rate_limit, max_prompts):
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Number of results to write to the database per transaction",
+)
+def batch_run(
+    input_file, model, template, system, output_file, rate_limit, max_prompts, batch_size
+):
     """Process prompts from a file"""
     from llm.batch_processing import BatchProcessor
     from llm import get_default_model
@@ -4652,7 +4888,8 @@ def batch_run(input_file, model, template, system, output_file, rate_limit, max_
         system=system,
         output_file=Path(output_file) if output_file else None,
         rate_limit=rate_limit,
-        max_prompts=max_prompts
+        max_prompts=max_prompts,
+        batch_size=batch_size,
     )
     
     click.echo(f"\nBatch processing completed!", err=True)
@@ -4680,15 +4917,17 @@ def batch_list(limit):
         click.echo("No batch runs found")
         return
     
-    click.echo(f"\nBatch Runs ({len(batches)})\n")
-    click.echo(f"{'ID':<10} {'Date':<20} {'Model':<15} {'Total':<8} {'Done':<8} {'Status':<10}")
-    click.echo("=" * 80)
-    
+    lines = [
+        f"\nBatch Runs ({len(batches)})\n",
+        f"{'ID':<10} {'Date':<20} {'Model':<15} {'Total':<8} {'Done':<8} {'Status':<10}",
+        "=" * 80,
+    ]
     for batch in batches:
         date_str = batch['created_at'][:19]
         status_str = batch['status']
-        click.echo(f"{batch['id'][:8]:<10} {date_str:<20} {batch['model']:<15} "
-                   f"{batch['total_prompts']:<8} {batch['completed_prompts']:<8} {status_str:<10}")
+        lines.append(f"{batch['id'][:8]:<10} {date_str:<20} {batch['model']:<15} "
+                     f"{batch['total_prompts']:<8} {batch['completed_prompts']:<8} {status_str:<10}")
+    click.echo("\n".join(lines))
 
 
 @batch_group.command(name="status")
@@ -4703,24 +4942,29 @@ def batch_status(batch_id):
     if not status:
         raise click.ClickException(f"Batch '{batch_id}' not found")
     
-    click.echo(f"\nBatch Status: {batch_id}")
-    click.echo("=" * 60)
-    click.echo(f"Status:       {status['status']}")
-    click.echo(f"Model:        {status['model']}")
-    click.echo(f"Input File:   {status['input_file']}")
+    lines = [
+        f"\nBatch Status: {batch_id}",
+        "=" * 60,
+        f"Status:       {status['status']}",
+        f"Model:        {status['model']}",
+        f"Input File:   {status['input_file']}",
+    ]
     if status['output_file']:
-        click.echo(f"Output File:  {status['output_file']}")
-    click.echo(f"Total:        {status['total_prompts']}")
-    click.echo(f"Completed:    {status['completed_prompts']}")
-    click.echo(f"Failed:       {status['failed_prompts']}")
+        lines.append(f"Output File:  {status['output_file']}")
+    lines.extend([
+        f"Total:        {status['total_prompts']}",
+        f"Completed:    {status['completed_prompts']}",
+        f"Failed:       {status['failed_prompts']}",
+    ])
     
     if status['total_prompts'] > 0:
         pct = (status['completed_prompts'] / status['total_prompts']) * 100
-        click.echo(f"Progress:     {pct:.1f}%")
+        lines.append(f"Progress:     {pct:.1f}%")
     
-    click.echo(f"Created:      {status['created_at']}")
+    lines.append(f"Created:      {status['created_at']}")
     if status['completed_at']:
-        click.echo(f"Completed:    {status['completed_at']}")
+        lines.append(f"Completed:    {status['completed_at']}")
+    click.echo("\n".join(lines))
 
 
 @cli.group(name="export")
@@ -4782,6 +5026,8 @@ def export_conversation_cmd(conversation_id, format, output, no_system, template
         raise click.ClickException(str(e))
     except Exception as e:
         raise click.ClickException(f"Export failed: {str(e)}")
+    finally:
+        manager.close()
 
 
 @export_group.command(name="comparison")
@@ -4831,6 +5077,8 @@ def export_comparison_cmd(comparison_id, format, output, template):
         raise click.ClickException(str(e))
     except Exception as e:
         raise click.ClickException(f"Export failed: {str(e)}")
+    finally:
+        manager.close()
 
 
 @export_group.command(name="batch")
@@ -4867,6 +5115,8 @@ def export_batch_cmd(batch_id, format, output):
         raise click.ClickException(str(e))
     except Exception as e:
         raise click.ClickException(f"Export failed: {str(e)}")
+    finally:
+        manager.close()
 
 
 @cli.group(name="branch")
@@ -4945,16 +5195,19 @@ def branch_list_cmd(conversation, include_archived):
         click.echo("No branches found")
         return
 
-    click.echo(f"\nBranches for conversation {conversation}:")
-    click.echo("=" * 70)
+    lines = [f"\nBranches for conversation {conversation}:", "=" * 70]
 
     for branch in branches:
         status = "" if branch["active"] else " [ARCHIVED]"
-        click.echo(f"\n{branch['branch_name']}{status}")
-        click.echo(f"  Messages: {branch['message_count']}")
-        click.echo(f"  Created:  {branch['created_at']}")
-        if branch['description']:
-            click.echo(f"  Description: {branch['description']}")
+        description = (
+            f"\n  Description: {branch['description']}" if branch['description'] else ""
+        )
+        lines.append(
+            f"\n{branch['branch_name']}{status}"
+            f"\n  Messages: {branch['message_count']}"
+            f"\n  Created:  {branch['created_at']}{description}"
+        )
+    click.echo("\n".join(lines))
 
 
 @branch_group.command(name="tree")
@@ -4997,21 +5250,19 @@ def branch_compare_cmd(branch1, branch2, conversation):
     try:
         comparison = navigator.compare_branches(conversation, branch1, branch2)
 
-        click.echo("\nBranch Comparison")
-        click.echo("=" * 70)
-        click.echo(f"\nBranch 1: {comparison['branch1']['name']}")
-        click.echo(f"  Total messages: {comparison['branch1']['total_messages']}")
-        click.echo(f"  Unique messages: {comparison['branch1']['unique_messages']}")
+        lines = ["\nBranch Comparison", "=" * 70]
+        for number in (1, 2):
+            branch = comparison[f"branch{number}"]
+            lines.append(f"\nBranch {number}: {branch['name']}")
+            lines.append(f"  Total messages: {branch['total_messages']}")
+            lines.append(f"  Unique messages: {branch['unique_messages']}")
 
-        click.echo(f"\nBranch 2: {comparison['branch2']['name']}")
-        click.echo(f"  Total messages: {comparison['branch2']['total_messages']}")
-        click.echo(f"  Unique messages: {comparison['branch2']['unique_messages']}")
-
-        click.echo(f"\nCommon messages: {comparison['common']['messages']}")
-        click.echo(f"Divergence point: Message #{comparison['common']['divergence_point']}")
+        lines.append(f"\nCommon messages: {comparison['common']['messages']}")
+        lines.append(f"Divergence point: Message #{comparison['common']['divergence_point']}")
 
         if comparison['common_ancestor']:
-            click.echo(f"Common ancestor: {comparison['common_ancestor']}")
+            lines.append(f"Common ancestor: {comparison['common_ancestor']}")
+        click.echo("\n".join(lines))
 
     except ValueError as e:
         raise click.ClickException(str(e))
@@ -5106,14 +5357,16 @@ def context_status_cmd(conversation):
     manager = ContextManager()
     status = manager.get_status(conversation)
 
-    click.echo(f"\nContext Status: {conversation}")
-    click.echo("=" * 60)
-    click.echo(f"Max tokens:       {status['max_tokens']}")
-    click.echo(f"Strategy:         {status['strategy']}")
-    click.echo(f"Auto-summarize:   {status['auto_summarize']}")
-    click.echo(f"Current messages: {status['current_messages']}")
-    click.echo(f"Estimated tokens: {status['estimated_tokens']}")
-    click.echo(f"Usage:            {status['percentage_used']:.1f}%")
+    click.echo("\n".join([
+        f"\nContext Status: {conversation}",
+        "=" * 60,
+        f"Max tokens:       {status['max_tokens']}",
+        f"Strategy:         {status['strategy']}",
+        f"Auto-summarize:   {status['auto_summarize']}",
+        f"Current messages: {status['current_messages']}",
+        f"Estimated tokens: {status['estimated_tokens']}",
+        f"Usage:            {status['percentage_used']:.1f}%",
+    ]))
 
 
 @context_group.command(name="set-limit")
@@ -5143,12 +5396,17 @@ def context_set_strategy_cmd(strategy, conversation):
 @context_group.command(name="summarize")
 @click.option("--conversation", "-c", required=True, help="Conversation ID")
 @click.option("--keep", type=int, default=5, help="Number of recent messages to keep")
-def context_summarize_cmd(conversation, keep):
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Summarize even if the conversation is well within its token limit"
+)
+def context_summarize_cmd(conversation, keep, force):
     """Summarize old messages"""
     from llm.context_manager import ContextManager
 
     manager = ContextManager()
-    summary = manager.summarize(conversation, keep_recent=keep)
+    summary = manager.summarize(conversation, keep_recent=keep, force=force)
     click.echo(f"\nSummary:\n{summary}")
 
 
@@ -5165,7 +5423,6 @@ def benchmark_group():
 def benchmark_create_cmd(name, from_file, description):
     """Create a new benchmark"""
     from llm.benchmark_manager import BenchmarkManager
-    import json
 
     if not from_file:
         raise click.ClickException("--from-file is required")
@@ -5193,17 +5450,19 @@ def benchmark_run_cmd(benchmark_name, models):
     run_id = manager.run_benchmark(benchmark_name, list(models))
     run = manager.get_run(run_id)
 
-    click.echo(f"\nBenchmark Results:")
-    click.echo("=" * 70)
+    lines = ["\nBenchmark Results:", "=" * 70]
 
     for model, scores in run["scores"].items():
-        click.echo(f"\n{model}:")
         if "error" in scores:
-            click.echo(f"  Error: {scores['error']}")
+            lines.append(f"\n{model}:\n  Error: {scores['error']}")
         else:
-            click.echo(f"  Accuracy: {scores['accuracy']*100:.1f}%")
-            click.echo(f"  Avg Time: {scores['avg_time']:.2f}s")
-            click.echo(f"  Tests:    {scores['total_tests']}")
+            lines.append(
+                f"\n{model}:"
+                f"\n  Accuracy: {scores['accuracy']*100:.1f}%"
+                f"\n  Avg Time: {scores['avg_time']:.2f}s"
+                f"\n  Tests:    {scores['total_tests']}"
+            )
+    click.echo("\n".join(lines))
 
 
 @benchmark_group.command(name="list")
@@ -5218,14 +5477,14 @@ def benchmark_list_cmd():
         click.echo("No benchmarks found")
         return
 
-    click.echo("\nAvailable Benchmarks:")
-    click.echo("=" * 70)
+    lines = ["\nAvailable Benchmarks:", "=" * 70]
 
     for b in benchmarks:
-        click.echo(f"\n{b['name']}")
+        lines.append(f"\n{b['name']}")
         if b['description']:
-            click.echo(f"  {b['description']}")
-        click.echo(f"  Created: {b['created_at']}")
+            lines.append(f"  {b['description']}")
+        lines.append(f"  Created: {b['created_at']}")
+    click.echo("\n".join(lines))
 
 
 @cli.group(name="optimize")
@@ -5248,11 +5507,13 @@ def optimize_prompt_cmd(prompt, strategy, model):
     if "error" in result:
         raise click.ClickException(result["error"])
 
-    click.echo("\nPrompt Optimization")
-    click.echo("=" * 70)
-    click.echo(f"\nOriginal:\n{result['original']}")
-    click.echo(f"\nOptimized ({result['strategy']}):\n{result['optimized']}")
-    click.echo(f"\nImprovement: {result['improvement']}")
+    click.echo("\n".join([
+        "\nPrompt Optimization",
+        "=" * 70,
+        f"\nOriginal:\n{result['original']}",
+        f"\nOptimized ({result['strategy']}):\n{result['optimized']}",
+        f"\nImprovement: {result['improvement']}",
+    ]))
 
 
 @optimize_group.command(name="test")
@@ -5266,17 +5527,17 @@ def optimize_test_cmd(prompt, variants, model):
     optimizer = PromptOptimizer()
     results = optimizer.test_variants(prompt, variants, model)
 
-    click.echo("\nPrompt Variants:")
-    click.echo("=" * 70)
+    lines = ["\nPrompt Variants:", "=" * 70]
 
     for r in results:
-        click.echo(f"\nVariant #{r['number']}:")
+        lines.append(f"\nVariant #{r['number']}:")
         if r.get('variant'):
-            click.echo(f"{r['variant']}")
+            lines.append(f"{r['variant']}")
             if "result" in r and "error" not in r["result"]:
-                click.echo(f"Response length: {r['result'].get('length', 0)} chars")
+                lines.append(f"Response length: {r['result'].get('length', 0)} chars")
         else:
-            click.echo(f"Error: {r.get('error', 'Unknown')}")
+            lines.append(f"Error: {r.get('error', 'Unknown')}")
+    click.echo("\n".join(lines))
 
 
 @cli.group(name="schedule")
@@ -5327,16 +5588,17 @@ def schedule_list_cmd():
         click.echo("No scheduled jobs")
         return
 
-    click.echo("\nScheduled Jobs:")
-    click.echo("=" * 70)
+    lines = ["\nScheduled Jobs:", "=" * 70]
 
     for job in jobs:
-        click.echo(f"\n{job['name'] or job['id']}")
-        click.echo(f"  Model:     {job['model']}")
-        click.echo(f"  Type:      {job['schedule_type']}")
-        click.echo(f"  Schedule:  {job['schedule_value']}")
-        if job['last_run']:
-            click.echo(f"  Last run:  {job['last_run']}")
+        last_run = f"\n  Last run:  {job['last_run']}" if job['last_run'] else ""
+        lines.append(
+            f"\n{job['name'] or job['id']}"
+            f"\n  Model:     {job['model']}"
+            f"\n  Type:      {job['schedule_type']}"
+            f"\n  Schedule:  {job['schedule_value']}{last_run}"
+        )
+    click.echo("\n".join(lines))
 
 
 @schedule_group.command(name="run")
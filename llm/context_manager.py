@@ -4,12 +4,37 @@ Context management functionality for LLM CLI.
 Manage conversation context windows and automatic summarization.
 """
 
-import sqlite3
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 from llm import user_dir, get_model
+from llm.utils import connect_shared_db
+
+
+# Messages per summarization prompt, and how many of those prompts run at once
+SUMMARY_CHUNK_SIZE = 20
+SUMMARY_MAX_WORKERS = 4
+
+# Fraction of the token limit a conversation must use before it is summarized
+SUMMARIZE_THRESHOLD = 0.5
+
+
+def _format_messages(messages: List[Dict[str, Any]]) -> str:
+    """Format messages as a User/Assistant transcript."""
+    parts = []
+    for msg in messages:
+        parts.append(f"User: {msg.get('prompt', '')}")
+        parts.append(f"Assistant: {msg.get('response', '')}")
+    return "\n\n".join(parts)
+
+
+def _estimate_tokens(prompt: Optional[str], response: Optional[str]) -> int:
+    """Estimate tokens for a prompt and response by counting words."""
+    return len((prompt or "").split()) + len((response or "").split())
 
 
 class ContextManager:
@@ -20,13 +45,19 @@ class ContextManager:
             db_path = user_dir() / "context.db"
         self.db_path = db_path
         self.logs_db_path = user_dir() / "logs.db"
+        self._logs_attached = False
+        self._summary_model = None
+        # (conversation_id, limit) -> (messages version, messages)
+        self._messages_cache: Dict[Tuple[str, Optional[int]], Tuple[Tuple, List]] = {}
         self._init_db()
 
     def _init_db(self):
-        """Initialize the context database."""
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-
-        conn = sqlite3.connect(str(self.db_path))
+        """Initialize the context database and open the connection all methods share."""
+        conn = connect_shared_db(self.db_path, cache_size=-20000)
+        self._conn = conn
+        # Closes the connection when the manager is closed or garbage
+        # collected, or at exit, without keeping the manager itself alive
+        self._finalizer = weakref.finalize(self, conn.close)
 
         conn.execute("""
             CREATE TABLE IF NOT EXISTS context_settings (
@@ -48,22 +79,47 @@ class ContextManager:
             )
         """)
 
+        # Token estimates for logged responses, calculated once per response
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS context_token_counts (
+                response_id TEXT PRIMARY KEY,
+                conversation_id TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            )
+        """)
+
         conn.commit()
-        conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._finalizer()
+
+    def _attach_logs(self) -> bool:
+        """Attach logs.db as the `logs` schema if it exists yet."""
+        if not self._logs_attached and self.logs_db_path.exists():
+            self._conn.execute("ATTACH DATABASE ? AS logs", (str(self.logs_db_path),))
+            self._logs_attached = True
+        return self._logs_attached
 
     def set_limit(self, conversation_id: str, max_tokens: int) -> bool:
         """Set token limit for a conversation."""
-        conn = sqlite3.connect(str(self.db_path))
         now = datetime.utcnow().isoformat()
 
-        conn.execute("""
-            INSERT OR REPLACE INTO context_settings
-            (conversation_id, max_tokens, updated_at)
-            VALUES (?, ?, ?)
-        """, (conversation_id, max_tokens, now))
-
-        conn.commit()
-        conn.close()
+        with self._conn:
+            self._conn.execute("""
+                INSERT INTO context_settings
+                (conversation_id, max_tokens, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(conversation_id) DO UPDATE SET
+                    max_tokens = excluded.max_tokens,
+                    updated_at = excluded.updated_at
+            """, (conversation_id, max_tokens, now))
         return True
 
     def set_strategy(self, conversation_id: str, strategy: str) -> bool:
@@ -73,26 +129,23 @@ class ContextManager:
         if strategy not in valid_strategies:
             raise ValueError(f"Invalid strategy. Must be one of: {', '.join(valid_strategies)}")
 
-        conn = sqlite3.connect(str(self.db_path))
         now = datetime.utcnow().isoformat()
 
-        conn.execute("""
-            INSERT OR REPLACE INTO context_settings
-            (conversation_id, strategy, updated_at)
-            VALUES (?, ?, ?)
-        """, (conversation_id, strategy, now))
-
-        conn.commit()
-        conn.close()
+        with self._conn:
+            self._conn.execute("""
+                INSERT INTO context_settings
+                (conversation_id, strategy, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(conversation_id) DO UPDATE SET
+                    strategy = excluded.strategy,
+                    updated_at = excluded.updated_at
+            """, (conversation_id, strategy, now))
         return True
 
     def get_status(self, conversation_id: str) -> Dict[str, Any]:
         """Get context status for a conversation."""
         # Get settings
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.execute("""
+        cursor = self._conn.execute("""
             SELECT * FROM context_settings
             WHERE conversation_id = ?
         """, (conversation_id,))
@@ -104,95 +157,196 @@ class ContextManager:
             "auto_summarize": True
         }
 
-        conn.close()
-
         # Get current token usage (simplified - would use tiktoken in production)
-        messages = self._get_conversation_messages(conversation_id)
-        estimated_tokens = sum(len(m.get("prompt", "").split()) + len(m.get("response", "").split())
-                              for m in messages)
+        message_count, estimated_tokens = self._get_token_usage(conversation_id)
+
+        max_tokens = int(settings.get("max_tokens") or 4096)
 
         return {
             "conversation_id": conversation_id,
-            "max_tokens": settings.get("max_tokens", 4096),
+            "max_tokens": max_tokens,
             "strategy": settings.get("strategy", "sliding_window"),
             "auto_summarize": settings.get("auto_summarize", True),
-            "current_messages": len(messages),
+            "current_messages": message_count,
             "estimated_tokens": estimated_tokens,
-            "percentage_used": (estimated_tokens / settings.get("max_tokens", 4096)) * 100
+            "percentage_used": estimated_tokens * 100.0 / max_tokens
         }
 
-    def summarize(self, conversation_id: str, keep_recent: int = 5) -> str:
-        """Summarize old messages in a conversation."""
-        messages = self._get_conversation_messages(conversation_id)
+    def summarize(
+        self, conversation_id: str, keep_recent: int = 5, force: bool = False
+    ) -> str:
+        """
+        Summarize old messages in a conversation.
 
-        if len(messages) <= keep_recent:
-            return "No messages to summarize"
+        Unless force is set, the summary model is not called while the
+        conversation uses less than SUMMARIZE_THRESHOLD of its token limit.
+        """
+        message_count = self._count_messages(conversation_id)
 
-        # Messages to summarize
-        to_summarize = messages[:-keep_recent]
+        if message_count <= keep_recent:
+            return "No messages to summarize"
 
-        # Create summary prompt
-        summary_text = []
-        for msg in to_summarize:
-            summary_text.append(f"User: {msg.get('prompt', '')}")
-            summary_text.append(f"Assistant: {msg.get('response', '')}")
+        if not force:
+            status = self.get_status(conversation_id)
+            if status["estimated_tokens"] < status["max_tokens"] * SUMMARIZE_THRESHOLD:
+                return "No summarization needed"
 
-        combined = "\n\n".join(summary_text)
+        # Messages to summarize - everything except the most recent
+        to_summarize = self._get_conversation_messages(
+            conversation_id, limit=message_count - keep_recent
+        )
 
         # Use model to create summary
         try:
-            model = get_model("gpt-4o-mini")  # Use cheaper model for summarization
-            response = model.prompt(
-                f"Summarize this conversation, preserving key information:\n\n{combined}",
-                system="You are a helpful assistant that creates concise summaries."
-            )
-            summary = response.text()
+            summary = self._summarize_messages(to_summarize)
         except Exception:
             summary = f"[{len(to_summarize)} messages from earlier in conversation]"
 
         # Save summary
-        import ulid
-        summary_id = str(ulid.ULID())
+        summary_id = uuid.uuid4().hex
         now = datetime.utcnow().isoformat()
 
-        conn = sqlite3.connect(str(self.db_path))
-        conn.execute("""
-            INSERT INTO context_summaries
-            (id, conversation_id, summary, messages_summarized, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (summary_id, conversation_id, summary, len(to_summarize), now))
-
-        conn.commit()
-        conn.close()
+        with self._conn:
+            self._conn.execute("""
+                INSERT INTO context_summaries
+                (id, conversation_id, summary, messages_summarized, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (summary_id, conversation_id, summary, len(to_summarize), now))
 
         return summary
 
+    def _summarize_messages(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Summarize messages with the summary model.
+
+        Long histories are split into chunks of SUMMARY_CHUNK_SIZE messages
+        which are summarized concurrently, then the partial summaries are
+        combined with one final prompt.
+        """
+        model = self._get_summary_model()
+
+        def summarize_text(text: str) -> str:
+            return model.prompt(
+                f"Summarize this conversation, preserving key information:\n\n{text}",
+                system="You are a helpful assistant that creates concise summaries."
+            ).text()
+
+        chunks = [
+            _format_messages(messages[i:i + SUMMARY_CHUNK_SIZE])
+            for i in range(0, len(messages), SUMMARY_CHUNK_SIZE)
+        ]
+        if len(chunks) == 1:
+            return summarize_text(chunks[0])
+
+        with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+            partial_summaries = list(executor.map(summarize_text, chunks))
+
+        return summarize_text("\n\n".join(
+            f"Part {number}: {partial}"
+            for number, partial in enumerate(partial_summaries, start=1)
+        ))
+
+    def _get_summary_model(self):
+        """Get the model used for summaries, resolving it on first use."""
+        if self._summary_model is None:
+            # Use cheaper model for summarization
+            self._summary_model = get_model("gpt-4o-mini")
+        return self._summary_model
+
     def clear(self, conversation_id: str, keep_recent: int = 0) -> int:
         """Clear old messages from context (marks them for exclusion)."""
-        messages = self._get_conversation_messages(conversation_id)
+        message_count = self._count_messages(conversation_id)
 
-        if len(messages) <= keep_recent:
+        if message_count <= keep_recent:
             return 0
 
         # In a real implementation, this would mark messages as excluded
         # from context but keep them in the database
-        return len(messages) - keep_recent
-
-    def _get_conversation_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a conversation."""
-        if not self.logs_db_path.exists():
+        return message_count - keep_recent
+
+    def _get_token_usage(self, conversation_id: str) -> Tuple[int, int]:
+        """
+        Get the (message count, estimated tokens) for a conversation.
+
+        Token estimates are stored in context_token_counts the first time a
+        response is seen, so later calls only need to estimate new responses
+        and can sum the rest in SQL.
+        """
+        if not self._attach_logs():
+            return 0, 0
+
+        new_responses = self._conn.execute("""
+            SELECT r.id, r.prompt, r.response
+            FROM logs.responses r
+            LEFT JOIN context_token_counts t ON t.response_id = r.id
+            WHERE r.conversation_id = ? AND t.response_id IS NULL
+        """, (conversation_id,)).fetchall()
+        if new_responses:
+            with self._conn:
+                self._conn.executemany("""
+                    INSERT INTO context_token_counts
+                    (response_id, conversation_id, tokens)
+                    VALUES (?, ?, ?)
+                """, [
+                    (response_id, conversation_id, _estimate_tokens(prompt, response))
+                    for response_id, prompt, response in new_responses
+                ])
+
+        count, tokens = self._conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(t.tokens), 0)
+            FROM logs.responses r
+            JOIN context_token_counts t ON t.response_id = r.id
+            WHERE r.conversation_id = ?
+        """, (conversation_id,)).fetchone()
+
+        return count, tokens
+
+    def _messages_version(self, conversation_id: str) -> Tuple[int, Optional[int]]:
+        """
+        Get (message count, highest rowid) for a conversation's logged messages.
+
+        This changes whenever messages are added to or removed from the
+        conversation, so it is used to tell when cached messages are stale.
+        """
+        if not self._attach_logs():
+            return 0, None
+
+        count, max_rowid = self._conn.execute("""
+            SELECT COUNT(*), MAX(rowid) FROM logs.responses
+            WHERE conversation_id = ?
+        """, (conversation_id,)).fetchone()
+        return count, max_rowid
+
+    def _count_messages(self, conversation_id: str) -> int:
+        """Count the messages in a conversation."""
+        return self._messages_version(conversation_id)[0]
+
+    def _get_conversation_messages(
+        self, conversation_id: str, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get messages for a conversation, oldest first, up to `limit` of them.
+
+        Results are cached on the instance until the conversation's messages
+        change, so repeated calls only cost a version check.
+        """
+        if not self._attach_logs():
             return []
 
-        conn = sqlite3.connect(str(self.logs_db_path))
-        conn.row_factory = sqlite3.Row
+        version = self._messages_version(conversation_id)
+        cached = self._messages_cache.get((conversation_id, limit))
+        if cached is not None and cached[0] == version:
+            return cached[1]
 
-        cursor = conn.execute("""
-            SELECT * FROM responses
+        # LIMIT -1 means no limit in SQLite
+        cursor = self._conn.execute("""
+            SELECT prompt, response, datetime_utc FROM logs.responses
             WHERE conversation_id = ?
             ORDER BY datetime_utc ASC
-        """, (conversation_id,))
+            LIMIT ?
+        """, (conversation_id, -1 if limit is None else limit))
 
         messages = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        self._messages_cache[(conversation_id, limit)] = (version, messages)
 
         return messages
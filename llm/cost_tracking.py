@@ -4,13 +4,20 @@ Cost tracking and budget management for LLM CLI.
 Tracks API spending, manages budgets, and provides cost analytics.
 """
 
+import atexit
 import json
 import sqlite3
+import threading
+import time
+import weakref
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from pathlib import Path
 
+import ulid
+
 from llm import user_dir
+from llm.utils import connect_shared_db
 
 
 # Model pricing (per 1K tokens) - as of Nov 2024
@@ -25,6 +32,68 @@ MODEL_PRICING = {
     "gemini-pro": {"input": 0.000125, "output": 0.000375},
 }
 
+# (input, output) pricing per 1K tokens for models not in the pricing table
+DEFAULT_PRICING = (0.001, 0.002)
+
+# Logged costs are written in one transaction once this many are pending,
+# or once this many seconds have passed since the last write
+FLUSH_BATCH_SIZE = 64
+FLUSH_INTERVAL = 0.5
+
+INSERT_COST_SQL = """
+    INSERT INTO costs (
+        id, timestamp, log_id, model, input_tokens, output_tokens,
+        input_cost, output_cost, total_cost, project, tags
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SELECT_PRICING_SQL = "SELECT model, input_cost_per_1k, output_cost_per_1k FROM pricing"
+
+# Start of each get_spending period, given the current time; any other
+# period covers all recorded spending
+PERIOD_STARTS = {
+    "today": lambda now: now.replace(hour=0, minute=0, second=0, microsecond=0),
+    "week": lambda now: now - timedelta(days=7),
+    "month": lambda now: now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+    "year": lambda now: now.replace(
+        month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+    ),
+}
+
+# Map budget period names to get_spending period names
+BUDGET_PERIODS = {
+    "daily": "today",
+    "weekly": "week",
+    "monthly": "month",
+    "yearly": "year"
+}
+
+
+def _write_pending_and_close(conn: sqlite3.Connection, pending: List[tuple]):
+    """
+    Write cost rows that were never flushed, then close the connection.
+
+    CostTracker.close() normally flushes first, so this only finds rows when
+    a tracker in a reference cycle is collected without __del__ running
+    first. Budgets cannot be checked then, since that needs the tracker.
+    """
+    if pending:
+        with conn:
+            conn.executemany(INSERT_COST_SQL, pending)
+        pending.clear()
+    conn.close()
+
+
+# Trackers that have not been closed. Any still open at exit are closed
+# then, so their pending costs are written and checked against budgets
+_open_trackers: "weakref.WeakSet[CostTracker]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_trackers():
+    for tracker in list(_open_trackers):
+        tracker.close()
+
 
 class CostTracker:
     """Manages cost tracking and budgets."""
@@ -33,13 +102,30 @@ class CostTracker:
         if db_path is None:
             db_path = user_dir() / "costs.db"
         self.db_path = db_path
+        # Serializes writes on the shared connection, which may be used from
+        # several threads (e.g. concurrent model comparisons)
+        self._lock = threading.Lock()
+        # Cost rows from log_cost() waiting to be written by flush()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
         self._init_db()
+        _open_trackers.add(self)
 
     def _init_db(self):
-        """Initialize the costs database."""
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-
-        conn = sqlite3.connect(str(self.db_path))
+        """Initialize the costs database and open the connection all methods share."""
+        conn = connect_shared_db(self.db_path)
+        self._conn = conn
+        # Reused by flush(), which only runs it while holding self._lock
+        self._insert_cursor = conn.cursor()
+        # Closes the connection once the tracker is closed or collected,
+        # without keeping the tracker itself alive. Trackers still open at
+        # exit are closed by _close_open_trackers() instead, which also
+        # checks budgets
+        self._finalizer = weakref.finalize(
+            self, _write_pending_and_close, conn, self._pending
+        )
+        self._finalizer.atexit = False
 
         # Costs table
         conn.execute("""
@@ -57,6 +143,19 @@ class CostTracker:
                 tags TEXT
             )
         """)
+        # Covers the date range, project and model filters of get_spending
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_costs_ts_proj_model
+            ON costs(timestamp, project, model)
+        """)
+        # Per-project and per-model budgets filter on one of these first
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_costs_project
+            ON costs(project, timestamp) WHERE project IS NOT NULL
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_costs_model ON costs(model, timestamp)"
+        )
 
         # Budgets table
         conn.execute("""
@@ -87,6 +186,10 @@ class CostTracker:
                 FOREIGN KEY (budget_id) REFERENCES budgets(id)
             )
         """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_budget_alerts_budget_id
+            ON budget_alerts(budget_id)
+        """)
 
         # Pricing table
         conn.execute("""
@@ -100,31 +203,61 @@ class CostTracker:
         """)
 
         # Initialize default pricing
-        for model, prices in MODEL_PRICING.items():
-            conn.execute("""
+        now = datetime.utcnow().isoformat()
+        with conn:
+            conn.executemany("""
                 INSERT OR IGNORE INTO pricing (model, input_cost_per_1k, output_cost_per_1k, last_updated)
                 VALUES (?, ?, ?, ?)
-            """, (model, prices["input"], prices["output"], datetime.utcnow().isoformat()))
+            """, [
+                (model, prices["input"], prices["output"], now)
+                for model, prices in MODEL_PRICING.items()
+            ])
+        self.refresh_pricing()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # Costs still pending when an unclosed tracker is garbage collected
+        # are written and checked against budgets, rather than deferred
+        if getattr(self, "_finalizer", None) is not None:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Write any pending cost entries, checking budgets, and close the
+        database connection.
+        """
+        _open_trackers.discard(self)
+        if self._finalizer.alive:
+            try:
+                self.flush()
+            finally:
+                self._finalizer()
+
+    def refresh_pricing(self):
+        """
+        Load the pricing table into memory.
+
+        The table is small and rarely changes, so cost lookups are served from
+        this cache. Call this again after changing the pricing table.
+        """
+        cursor = self._conn.execute(SELECT_PRICING_SQL)
+        self._pricing = {
+            model: (input_cost_per_1k, output_cost_per_1k)
+            for model, input_cost_per_1k, output_cost_per_1k in cursor
+        }
 
-        conn.commit()
-        conn.close()
+    def _get_pricing(self, model: str) -> Tuple[float, float]:
+        """Get (input, output) cost per 1K tokens for a model."""
+        return self._pricing.get(model, DEFAULT_PRICING)
 
     def calculate_cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
         """Calculate cost for a model call."""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.execute(
-            "SELECT input_cost_per_1k, output_cost_per_1k FROM pricing WHERE model = ?",
-            (model,)
-        )
-        row = cursor.fetchone()
-        conn.close()
-
-        if row:
-            input_cost_per_1k, output_cost_per_1k = row
-        else:
-            # Default pricing if model not found
-            input_cost_per_1k = 0.001
-            output_cost_per_1k = 0.002
+        input_cost_per_1k, output_cost_per_1k = self._get_pricing(model)
 
         input_cost = (input_tokens / 1000) * input_cost_per_1k
         output_cost = (output_tokens / 1000) * output_cost_per_1k
@@ -140,54 +273,60 @@ class CostTracker:
         tags: Optional[List[str]] = None
     ) -> str:
         """Log a cost entry."""
-        import ulid
-
         cost_id = str(ulid.ULID())
         timestamp = datetime.utcnow().isoformat()
 
-        total_cost = self.calculate_cost(model, input_tokens, output_tokens)
-        input_cost = (input_tokens / 1000) * self._get_input_cost(model)
-        output_cost = (output_tokens / 1000) * self._get_output_cost(model)
+        input_cost_per_1k, output_cost_per_1k = self._get_pricing(model)
+        input_cost = (input_tokens / 1000) * input_cost_per_1k
+        output_cost = (output_tokens / 1000) * output_cost_per_1k
+        total_cost = input_cost + output_cost
 
         tags_json = json.dumps(tags) if tags else None
 
-        conn = sqlite3.connect(str(self.db_path))
-        conn.execute("""
-            INSERT INTO costs (
-                id, timestamp, log_id, model, input_tokens, output_tokens,
-                input_cost, output_cost, total_cost, project, tags
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            cost_id, timestamp, log_id, model, input_tokens, output_tokens,
-            input_cost, output_cost, total_cost, project, tags_json
-        ))
-        conn.commit()
-        conn.close()
+        with self._pending_lock:
+            self._pending.append((
+                cost_id, timestamp, log_id, model, input_tokens, output_tokens,
+                input_cost, output_cost, total_cost, project, tags_json
+            ))
+            flush_due = (
+                len(self._pending) >= FLUSH_BATCH_SIZE
+                or time.monotonic() - self._last_flush > FLUSH_INTERVAL
+            )
 
-        # Check budgets
-        self._check_budgets(model, project)
+        if flush_due:
+            self.flush()
 
         return cost_id
 
+    def flush(self):
+        """
+        Write pending cost entries in a single transaction.
+
+        Budgets are checked for each model and project that was written.
+        Reads flush first, so callers only need this to force a write.
+        """
+        with self._pending_lock:
+            # Emptied in place, since the finalizer holds the same list
+            rows = self._pending[:]
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+        if not rows:
+            return
+
+        with self._lock, self._conn:
+            self._insert_cursor.executemany(INSERT_COST_SQL, rows)
+
+        # Check budgets
+        self._check_budgets({row[3] for row in rows}, {row[9] for row in rows})
+
     def _get_input_cost(self, model: str) -> float:
         """Get input cost per 1K tokens for a model."""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.execute(
-            "SELECT input_cost_per_1k FROM pricing WHERE model = ?", (model,)
-        )
-        row = cursor.fetchone()
-        conn.close()
-        return row[0] if row else 0.001
+        return self._get_pricing(model)[0]
 
     def _get_output_cost(self, model: str) -> float:
         """Get output cost per 1K tokens for a model."""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.execute(
-            "SELECT output_cost_per_1k FROM pricing WHERE model = ?", (model,)
-        )
-        row = cursor.fetchone()
-        conn.close()
-        return row[0] if row else 0.002
+        return self._get_pricing(model)[1]
 
     def get_spending(
         self,
@@ -198,32 +337,21 @@ class CostTracker:
         to_date: Optional[str] = None
     ) -> Dict[str, Any]:
         """Get spending summary for a period."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
+        self.flush()
 
         # Determine date range
-        now = datetime.utcnow()
         if from_date and to_date:
             start_date = from_date
             end_date = to_date
-        elif period == "today":
-            start_date = now.replace(hour=0, minute=0, second=0).isoformat()
-            end_date = now.isoformat()
-        elif period == "week":
-            start_date = (now - timedelta(days=7)).isoformat()
-            end_date = now.isoformat()
-        elif period == "month":
-            start_date = now.replace(day=1, hour=0, minute=0, second=0).isoformat()
-            end_date = now.isoformat()
-        elif period == "year":
-            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0).isoformat()
-            end_date = now.isoformat()
-        else:  # all
-            start_date = "2000-01-01"
-            end_date = now.isoformat()
-
-        # Build query
-        query = "SELECT * FROM costs WHERE timestamp >= ? AND timestamp <= ?"
+        else:
+            start_date, end_date = self._period_range(period)
+
+        # Build query - SQLite does the aggregation, one row per model
+        query = (
+            "SELECT model, SUM(total_cost), COUNT(*), "
+            "SUM(input_tokens + output_tokens) FROM costs "
+            "WHERE timestamp >= ? AND timestamp <= ?"
+        )
         params = [start_date, end_date]
 
         if project:
@@ -232,25 +360,18 @@ class CostTracker:
         if model:
             query += " AND model = ?"
             params.append(model)
+        query += " GROUP BY model"
 
-        cursor = conn.execute(query, params)
-        costs = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-
-        # Calculate summary
-        total_cost = sum(c['total_cost'] for c in costs)
-        total_prompts = len(costs)
-        total_tokens = sum(c['input_tokens'] + c['output_tokens'] for c in costs)
-
-        # Group by model
+        total_cost = 0
+        total_prompts = 0
+        total_tokens = 0
         by_model = {}
-        for cost in costs:
-            model_name = cost['model']
-            if model_name not in by_model:
-                by_model[model_name] = {'cost': 0, 'prompts': 0, 'tokens': 0}
-            by_model[model_name]['cost'] += cost['total_cost']
-            by_model[model_name]['prompts'] += 1
-            by_model[model_name]['tokens'] += cost['input_tokens'] + cost['output_tokens']
+        rows = self._conn.execute(query, params)
+        for model_name, cost, prompts, tokens in rows:
+            total_cost += cost
+            total_prompts += prompts
+            total_tokens += tokens
+            by_model[model_name] = {'cost': cost, 'prompts': prompts, 'tokens': tokens}
 
         return {
             'total_cost': total_cost,
@@ -263,6 +384,16 @@ class CostTracker:
             'end_date': end_date
         }
 
+    def _period_range(
+        self, period: str, now: Optional[datetime] = None
+    ) -> Tuple[str, str]:
+        """Get the (start, end) timestamps of a spending period ending now."""
+        if now is None:
+            now = datetime.utcnow()
+        period_start = PERIOD_STARTS.get(period)
+        start = period_start(now).isoformat() if period_start else "2000-01-01"
+        return start, now.isoformat()
+
     def set_budget(
         self,
         name: str,
@@ -274,14 +405,11 @@ class CostTracker:
         hard_limit: bool = False
     ) -> str:
         """Set a budget."""
-        import ulid
-
         budget_id = str(ulid.ULID())
         now = datetime.utcnow().isoformat()
 
-        conn = sqlite3.connect(str(self.db_path))
-        try:
-            conn.execute("""
+        with self._lock, self._conn:
+            self._conn.execute("""
                 INSERT INTO budgets (
                     id, name, amount, period, category, category_value,
                     alert_threshold, hard_limit, created_at, active
@@ -290,60 +418,43 @@ class CostTracker:
                 budget_id, name, amount, period, category, category_value,
                 alert_threshold, hard_limit, now, True
             ))
-            conn.commit()
-        finally:
-            conn.close()
 
         return budget_id
 
     def get_budgets(self, active_only: bool = True) -> List[Dict[str, Any]]:
         """Get all budgets."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-
         query = "SELECT * FROM budgets"
         if active_only:
             query += " WHERE active = 1"
 
-        cursor = conn.execute(query)
+        cursor = self._conn.execute(query)
         budgets = [dict(row) for row in cursor.fetchall()]
-        conn.close()
 
         return budgets
 
     def check_budget_status(self, budget_name: str) -> Dict[str, Any]:
         """Check status of a specific budget."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.execute(
+        cursor = self._conn.execute(
             "SELECT * FROM budgets WHERE name = ? AND active = 1", (budget_name,)
         )
         budget = cursor.fetchone()
-        conn.close()
 
         if not budget:
             return None
 
         budget = dict(budget)
 
-        # Map budget period names to get_spending period names
-        period_mapping = {
-            "daily": "today",
-            "weekly": "week",
-            "monthly": "month",
-            "yearly": "year"
-        }
-        spending_period = period_mapping.get(budget['period'], budget['period'])
-
         # Get spending for this budget's period
         spending = self.get_spending(
-            period=spending_period,
+            period=BUDGET_PERIODS.get(budget['period'], budget['period']),
             project=budget['category_value'] if budget['category'] == 'project' else None,
             model=budget['category_value'] if budget['category'] == 'model' else None
         )
 
-        spent = spending['total_cost']
+        return self._budget_status(budget, spending['total_cost'])
+
+    def _budget_status(self, budget: Dict[str, Any], spent: float) -> Dict[str, Any]:
+        """Build the status of a budget given what has been spent in its period."""
         remaining = budget['amount'] - spent
         percentage = (spent / budget['amount']) * 100 if budget['amount'] > 0 else 0
 
@@ -369,20 +480,48 @@ class CostTracker:
         else:
             return "ok"
 
-    def _check_budgets(self, model: Optional[str] = None, project: Optional[str] = None):
-        """Check all budgets and send alerts if needed."""
-        budgets = self.get_budgets(active_only=True)
-
-        for budget in budgets:
+    def _check_budgets(self, models: Set[str], projects: Set[Optional[str]]):
+        """Check budgets covering these models and projects, alerting if needed."""
+        budgets = []
+        for budget in self.get_budgets(active_only=True):
             # Filter budgets based on category
-            if budget['category'] == 'model' and budget['category_value'] != model:
+            value = budget['category_value']
+            if budget['category'] == 'model' and value not in models:
                 continue
-            if budget['category'] == 'project' and budget['category_value'] != project:
+            if budget['category'] == 'project' and value not in projects:
                 continue
+            budgets.append(budget)
 
-            status = self.check_budget_status(budget['name'])
-            if not status:
-                continue
+        if not budgets:
+            return
+
+        # Spending by model and project for every budget period, in one query
+        periods = list(dict.fromkeys(
+            BUDGET_PERIODS.get(budget['period'], budget['period']) for budget in budgets
+        ))
+        now = datetime.utcnow()
+        starts = [self._period_range(period, now)[0] for period in periods]
+        end = now.isoformat()
+        sums = ", ".join(
+            "SUM(CASE WHEN timestamp >= ? THEN total_cost ELSE 0 END)" for _ in periods
+        )
+        rows = self._conn.execute(
+            f"SELECT model, project, {sums} FROM costs "
+            "WHERE timestamp >= ? AND timestamp <= ? GROUP BY model, project",
+            starts + [min(starts), end]
+        ).fetchall()
+
+        for budget in budgets:
+            period = BUDGET_PERIODS.get(budget['period'], budget['period'])
+            column = 2 + periods.index(period)
+            value = budget['category_value']
+            if budget['category'] == 'model':
+                spent = sum(row[column] for row in rows if row[0] == value)
+            elif budget['category'] == 'project':
+                spent = sum(row[column] for row in rows if row[1] == value)
+            else:
+                spent = sum(row[column] for row in rows)
+            status = self._budget_status(budget, spent)
 
             # Check if alert is needed
             if status['percentage'] >= (budget['alert_threshold'] * 100):
@@ -390,33 +529,26 @@ class CostTracker:
 
     def _create_alert(self, budget: Dict[str, Any], status: Dict[str, Any]):
         """Create a budget alert."""
-        import ulid
-
         alert_id = str(ulid.ULID())
         now = datetime.utcnow().isoformat()
 
         alert_type = "warning" if status['percentage'] < 100 else "limit_reached"
 
-        conn = sqlite3.connect(str(self.db_path))
-        conn.execute("""
-            INSERT INTO budget_alerts (
-                id, budget_id, timestamp, spent, budget_amount, percentage, alert_type
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            alert_id, budget['id'], now, status['spent'],
-            budget['amount'], status['percentage'], alert_type
-        ))
-        conn.commit()
-        conn.close()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO budget_alerts (
+                    id, budget_id, timestamp, spent, budget_amount, percentage, alert_type
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                alert_id, budget['id'], now, status['spent'],
+                budget['amount'], status['percentage'], alert_type
+            ))
 
         # In a real implementation, this would send notifications
         # For now, just store the alert
 
     def delete_budget(self, name: str) -> bool:
         """Delete a budget."""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.execute("DELETE FROM budgets WHERE name = ?", (name,))
-        conn.commit()
-        deleted = cursor.rowcount > 0
-        conn.close()
-        return deleted
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM budgets WHERE name = ?", (name,))
+        return cursor.rowcount > 0
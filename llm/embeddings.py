@@ -2,12 +2,38 @@ from .models import EmbeddingModel
 from .embeddings_migrations import embeddings_migrations
 from dataclasses import dataclass
 import hashlib
-from itertools import islice
 import json
 from sqlite_utils import Database
 from sqlite_utils.db import Table
 import time
-from typing import cast, Any, Dict, Iterable, List, Optional, Tuple, Union
+from typing import cast, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# Batches passed to the embedding model are cut short once their combined
+# content reaches this many characters (or bytes, for binary content)
+BATCH_CONTENT_LENGTH = 1_000_000
+
+
+def _content_batches(
+    entries: Iterable[Tuple[str, Union[str, bytes], Optional[Dict[str, Any]]]],
+    batch_size: int,
+    max_length: int,
+) -> Iterator[List[Tuple[str, Union[str, bytes], Optional[Dict[str, Any]]]]]:
+    """
+    Group entries into lists of at most batch_size items, also ending a batch
+    early once the combined length of its content reaches max_length.
+    """
+    batch: List[Tuple[str, Union[str, bytes], Optional[Dict[str, Any]]]] = []
+    length = 0
+    for entry in entries:
+        batch.append(entry)
+        length += len(entry[1])
+        if len(batch) >= batch_size or length >= max_length:
+            yield batch
+            batch = []
+            length = 0
+    if batch:
+        yield batch
 
 
 @dataclass
@@ -187,32 +213,34 @@ class Collection:
         import llm
 
         batch_size = min(batch_size, (self.model().batch_size or batch_size))
-        iterator = iter(entries)
         collection_id = self.id
-        while True:
-            batch = list(islice(iterator, batch_size))
-            if not batch:
-                break
+        for batch in _content_batches(entries, batch_size, BATCH_CONTENT_LENGTH):
             # Calculate hashes first
-            items_and_hashes = [(item, self.content_hash(item[1])) for item in batch]
+            hashes = [self.content_hash(item[1]) for item in batch]
             # Any of those hashes already exist?
-            existing_ids = [
+            existing_ids = {
                 row["id"]
                 for row in self.db.query(
                     """
                     select id from embeddings
                     where collection_id = ? and content_hash in ({})
                     """.format(
-                        ",".join("?" for _ in items_and_hashes)
+                        ",".join("?" for _ in hashes)
                     ),
-                    [collection_id]
-                    + [item_and_hash[1] for item_and_hash in items_and_hashes],
+                    [collection_id] + hashes,
                 )
+            }
+            filtered_batch = [
+                (item, content_hash)
+                for item, content_hash in zip(batch, hashes)
+                if item[0] not in existing_ids
             ]
-            filtered_batch = [item for item in batch if item[0] not in existing_ids]
+            if not filtered_batch:
+                continue
             embeddings = list(
-                self.model().embed_multi(item[1] for item in filtered_batch)
+                self.model().embed_multi(item[1] for item, _ in filtered_batch)
             )
+            updated = int(time.time())
             with self.db.conn:
                 cast(Table, self.db["embeddings"]).insert_all(
                     (
@@ -226,14 +254,15 @@ class Collection:
                             "content_blob": (
                                 value if (store and isinstance(value, bytes)) else None
                             ),
-                            "content_hash": self.content_hash(value),
+                            "content_hash": content_hash,
                             "metadata": json.dumps(metadata) if metadata else None,
-                            "updated": int(time.time()),
+                            "updated": updated,
                         }
-                        for (embedding, (id, value, metadata)) in zip(
+                        for (embedding, ((id, value, metadata), content_hash)) in zip(
                             embeddings, filtered_batch
                         )
                     ),
+                    batch_size=len(filtered_batch),
                     replace=True,
                 )
 
@@ -91,3 +91,12 @@ def m005_add_content_blob(db):
     db["embeddings"].transform(
         column_order=("collection_id", "id", "embedding", "content", "content_blob")
     )
+
+
+@embeddings_migrations()
+def m006_collection_content_hash_index(db):
+    # Lets the check for already-embedded content in embed_multi() seek
+    # straight to matching hashes instead of scanning the whole collection.
+    # Counting embeddings per collection is already served by the
+    # (collection_id, id) primary key index.
+    db["embeddings"].create_index(["collection_id", "content_hash"])
@@ -4,10 +4,13 @@ Export functionality for LLM CLI.
 Export conversations, comparisons, and batch results to various formats.
 """
 
+import io
 import json
+import os
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Set, TextIO, Tuple
 from datetime import datetime
 
 from llm import user_dir
@@ -20,6 +23,75 @@ class ExportManager:
         self.logs_db_path = user_dir() / "logs.db"
         self.comparisons_db_path = user_dir() / "comparisons.db"
         self.batch_db_path = user_dir() / "batch.db"
+        # Read-only connections, opened on first use and kept until close()
+        self._connections: Dict[Path, sqlite3.Connection] = {}
+        # Data read for each exported item, keyed by (kind, id), so exporting
+        # the same item to several formats reads the database once
+        self._data_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # Output directories already created by this manager
+        self._created_dirs: Set[Path] = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close any database connections opened by this manager."""
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def invalidate(self, item_id: Optional[str] = None) -> None:
+        """Forget cached data for a conversation, comparison or batch, or for all."""
+        if item_id is None:
+            self._data_cache.clear()
+            return
+        for key in [key for key in self._data_cache if key[1] == item_id]:
+            del self._data_cache[key]
+
+    @contextmanager
+    def _open_output(
+        self, output_file: Path, newline: Optional[str] = None
+    ) -> Iterator[TextIO]:
+        """
+        Open an export file for writing, creating its directory if needed.
+
+        Output goes to a temporary file in the same directory, which replaces
+        output_file only once everything has been written. If the export
+        fails, an existing file at output_file is left untouched.
+        """
+        if not isinstance(output_file, Path):
+            output_file = Path(output_file)
+        parent = output_file.parent
+        if parent not in self._created_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(parent)
+        tmp_path = parent / f".{output_file.name}.{os.getpid()}.tmp"
+        # Remove any stale temporary file, so the usual umask applies when
+        # it is created, as it would for open(output_file, 'w')
+        tmp_path.unlink(missing_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, 'w', newline=newline, encoding='utf-8') as f:
+                yield f
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _connect(self, db_path: Path) -> sqlite3.Connection:
+        """Get the read-only connection to a database, opening it on first use."""
+        conn = self._connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=1")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-64000")
+            self._connections[db_path] = conn
+        return conn
 
     def export_conversation(
         self,
@@ -36,31 +108,31 @@ class ExportManager:
         if not conversation_data:
             raise ValueError(f"Conversation {conversation_id} not found")
 
-        # Export based on format
-        if output_format == "html":
-            from llm.exporters.html import HTMLExporter
-            exporter = HTMLExporter(template=template)
-            content = exporter.export_conversation(conversation_data, include_system=include_system)
-        elif output_format == "markdown":
-            from llm.exporters.markdown import MarkdownExporter
-            exporter = MarkdownExporter()
-            content = exporter.export_conversation(conversation_data, include_system=include_system)
-        elif output_format == "json":
-            content = json.dumps(conversation_data, indent=2)
-        elif output_format == "text":
-            content = self._format_conversation_text(conversation_data, include_system=include_system)
-        else:
+        if output_format not in ("html", "markdown", "json", "text"):
             raise ValueError(f"Unsupported format: {output_format}")
 
+        # HTML and Markdown are built as one string, so they are rendered
+        # before the output file is touched
+        content = self._render_conversation(
+            conversation_data, output_format, template, include_system
+        )
+
         # Write to file if specified
         if output_file:
-            output_file = Path(output_file)
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with self._open_output(output_file) as f:
+                if content is None:
+                    self._write_conversation(
+                        conversation_data, output_format, f, include_system
+                    )
+                else:
+                    f.write(content)
             return str(output_file)
 
-        return content
+        if content is not None:
+            return content
+        buffer = io.StringIO()
+        self._write_conversation(conversation_data, output_format, buffer, include_system)
+        return buffer.getvalue()
 
     def export_comparison(
         self,
@@ -76,25 +148,14 @@ class ExportManager:
         if not comparison_data:
             raise ValueError(f"Comparison {comparison_id} not found")
 
-        # Export based on format
-        if output_format == "html":
-            from llm.exporters.html import HTMLExporter
-            exporter = HTMLExporter(template=template)
-            content = exporter.export_comparison(comparison_data)
-        elif output_format == "markdown":
-            from llm.exporters.markdown import MarkdownExporter
-            exporter = MarkdownExporter()
-            content = exporter.export_comparison(comparison_data)
-        elif output_format == "json":
-            content = json.dumps(comparison_data, indent=2)
-        else:
+        if output_format not in ("html", "markdown", "json"):
             raise ValueError(f"Unsupported format: {output_format}")
 
+        content = self._render_comparison(comparison_data, output_format, template)
+
         # Write to file if specified
         if output_file:
-            output_file = Path(output_file)
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with self._open_output(output_file) as f:
                 f.write(content)
             return str(output_file)
 
@@ -116,48 +177,128 @@ class ExportManager:
         # Export based on format
         if output_format == "csv":
             import csv
-            output_file = Path(output_file) if output_file else Path(f"batch_{batch_id}.csv")
+            output_file = output_file or f"batch_{batch_id}.csv"
 
             results = batch_data.get("results", [])
             fieldnames = ["index", "prompt", "response", "success", "error", "tokens", "cost"]
 
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for result in results:
-                    writer.writerow({
-                        "index": result.get("prompt_index", ""),
-                        "prompt": result.get("prompt", ""),
-                        "response": result.get("response", ""),
-                        "success": result.get("success", False),
-                        "error": result.get("error", ""),
-                        "tokens": result.get("tokens_used", 0),
-                        "cost": result.get("cost", 0)
-                    })
+            # Results are written as they are read from the database, one row
+            # at a time, without building an intermediate dict per row
+            with self._open_output(output_file, newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(fieldnames)
+                writer.writerows(
+                    (
+                        result.get("prompt_index", ""),
+                        result.get("prompt", ""),
+                        result.get("response", ""),
+                        result.get("success", False),
+                        result.get("error", ""),
+                        result.get("tokens_used", 0),
+                        result.get("cost", 0)
+                    )
+                    for result in results
+                )
 
             return str(output_file)
-        elif output_format == "json":
-            content = json.dumps(batch_data, indent=2)
-        else:
+        elif output_format != "json":
             raise ValueError(f"Unsupported format: {output_format}")
 
         # Write to file if specified
         if output_file:
-            output_file = Path(output_file)
-            output_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with self._open_output(output_file) as f:
+                self._write_batch_json(batch_data, f)
             return str(output_file)
 
-        return content
+        buffer = io.StringIO()
+        self._write_batch_json(batch_data, buffer)
+        return buffer.getvalue()
+
+    def _render_conversation(
+        self,
+        conversation_data: Dict[str, Any],
+        output_format: str,
+        template: Optional[str] = None,
+        include_system: bool = True
+    ) -> Optional[str]:
+        """Render a conversation as HTML or Markdown, or return None for other formats."""
+        if output_format == "html":
+            from llm.exporters.html import HTMLExporter
+            exporter = HTMLExporter(template=template)
+            return exporter.export_conversation(conversation_data, include_system=include_system)
+        if output_format == "markdown":
+            from llm.exporters.markdown import MarkdownExporter
+            exporter = MarkdownExporter()
+            return exporter.export_conversation(conversation_data, include_system=include_system)
+        return None
+
+    def _write_conversation(
+        self,
+        conversation_data: Dict[str, Any],
+        output_format: str,
+        f: TextIO,
+        include_system: bool = True
+    ) -> None:
+        """Write a conversation to a file object as JSON or text."""
+        if output_format == "json":
+            json.dump(conversation_data, f, indent=2)
+        elif output_format == "text":
+            # Lines are joined with "\n" as they are written, with no trailing newline
+            lines = self._iter_conversation_text(conversation_data, include_system)
+            f.write(next(lines))
+            for line in lines:
+                f.write("\n")
+                f.write(line)
+
+    def _render_comparison(
+        self,
+        comparison_data: Dict[str, Any],
+        output_format: str,
+        template: Optional[str] = None
+    ) -> str:
+        """Render a model comparison in the specified format."""
+        if output_format == "html":
+            from llm.exporters.html import HTMLExporter
+            exporter = HTMLExporter(template=template)
+            return exporter.export_comparison(comparison_data)
+        if output_format == "markdown":
+            from llm.exporters.markdown import MarkdownExporter
+            exporter = MarkdownExporter()
+            return exporter.export_comparison(comparison_data)
+        return json.dumps(comparison_data, indent=2)
+
+    def _write_batch_json(self, batch_data: Dict[str, Any], f: TextIO) -> None:
+        """
+        Write batch data as indented JSON, one result at a time.
+
+        The output matches json.dumps(batch_data, indent=2) with "results" as
+        the last key, without holding all of the serialized results in memory.
+        """
+        header = {key: value for key, value in batch_data.items() if key != "results"}
+        if header:
+            # Drop the closing "\n}" so "results" can follow the other keys
+            f.write(json.dumps(header, indent=2)[:-2] + ',\n  "results": ')
+        else:
+            f.write('{\n  "results": ')
+
+        first = True
+        for result in batch_data.get("results", []):
+            f.write("[\n    " if first else ",\n    ")
+            f.write(json.dumps(result, indent=2).replace("\n", "\n    "))
+            first = False
+        f.write("[]" if first else "\n  ]")
+        f.write("\n}")
 
     def _get_conversation_data(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """Get conversation data from logs database."""
+        cached = self._data_cache.get(("conversation", conversation_id))
+        if cached is not None:
+            return cached
+
         if not self.logs_db_path.exists():
             return None
 
-        conn = sqlite3.connect(str(self.logs_db_path))
-        conn.row_factory = sqlite3.Row
+        conn = self._connect(self.logs_db_path)
 
         # Get conversation info
         cursor = conn.execute(
@@ -167,43 +308,44 @@ class ExportManager:
         conversation = cursor.fetchone()
 
         if not conversation:
-            conn.close()
             return None
 
         # Get messages
-        cursor = conn.execute(
+        messages = list(self._iter_dicts(
+            conn,
             """
             SELECT * FROM responses
             WHERE conversation_id = ?
             ORDER BY datetime_utc ASC
             """,
             (conversation_id,)
-        )
-        messages = [dict(row) for row in cursor.fetchall()]
+        ))
 
-        conn.close()
-
-        return {
+        conversation_data = {
             "id": conversation_id,
             "name": conversation["name"] if conversation else None,
             "model": conversation["model"] if conversation else None,
             "messages": messages
         }
+        self._data_cache[("conversation", conversation_id)] = conversation_data
+        return conversation_data
 
     def _get_comparison_data(self, comparison_id: str) -> Optional[Dict[str, Any]]:
         """Get comparison data from comparisons database."""
+        cached = self._data_cache.get(("comparison", comparison_id))
+        if cached is not None:
+            return cached
+
         if not self.comparisons_db_path.exists():
             return None
 
-        conn = sqlite3.connect(str(self.comparisons_db_path))
-        conn.row_factory = sqlite3.Row
+        conn = self._connect(self.comparisons_db_path)
 
         cursor = conn.execute(
             "SELECT * FROM comparisons WHERE id = ?",
             (comparison_id,)
         )
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             return None
@@ -213,15 +355,28 @@ class ExportManager:
         comparison['responses'] = json.loads(comparison['responses'])
         comparison['metrics'] = json.loads(comparison['metrics'])
 
+        self._data_cache[("comparison", comparison_id)] = comparison
         return comparison
 
     def _get_batch_data(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """Get batch data from batch database."""
+        batch_data = self._data_cache.get(("batch", batch_id))
+        if batch_data is None:
+            batch_data = self._get_batch_run(batch_id)
+            if batch_data is None:
+                return None
+            self._data_cache[("batch", batch_id)] = batch_data
+
+        # Results are read lazily so exports can stream them, and an
+        # iterator can only be consumed once, so they are never cached
+        return dict(batch_data, results=self._iter_batch_results(batch_id))
+
+    def _get_batch_run(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a batch run's details, without its results."""
         if not self.batch_db_path.exists():
             return None
 
-        conn = sqlite3.connect(str(self.batch_db_path))
-        conn.row_factory = sqlite3.Row
+        conn = self._connect(self.batch_db_path)
 
         # Get batch run info
         cursor = conn.execute(
@@ -231,38 +386,53 @@ class ExportManager:
         batch_run = cursor.fetchone()
 
         if not batch_run:
-            conn.close()
             return None
 
-        # Get results
-        cursor = conn.execute(
-            "SELECT * FROM batch_results WHERE batch_id = ? ORDER BY prompt_index",
-            (batch_id,)
-        )
-        results = [dict(row) for row in cursor.fetchall()]
-
-        conn.close()
-
         batch_data = dict(batch_run)
         if batch_data.get('config'):
             batch_data['config'] = json.loads(batch_data['config'])
-        batch_data['results'] = results
 
         return batch_data
 
-    def _format_conversation_text(
+    def _iter_batch_results(self, batch_id: str) -> Iterator[Dict[str, Any]]:
+        """Yield the results of a batch in prompt order, fetching them in pages."""
+        return self._iter_dicts(
+            self._connect(self.batch_db_path),
+            "SELECT * FROM batch_results WHERE batch_id = ? ORDER BY prompt_index",
+            (batch_id,)
+        )
+
+    def _iter_dicts(
+        self, conn: sqlite3.Connection, sql: str, params: Tuple = ()
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the rows of a query as dicts, fetching them in pages.
+
+        Rows are fetched as plain tuples and zipped with column names looked up
+        once, which is cheaper than building a dict from each sqlite3.Row.
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def _iter_conversation_text(
         self,
         conversation_data: Dict[str, Any],
         include_system: bool = True
-    ) -> str:
-        """Format conversation as plain text."""
-        output = []
-
-        output.append("=" * 70)
-        output.append(f"CONVERSATION: {conversation_data.get('name', 'Untitled')}")
-        output.append(f"Model: {conversation_data.get('model', 'Unknown')}")
-        output.append("=" * 70)
-        output.append("")
+    ) -> Iterator[str]:
+        """Yield the lines of a conversation formatted as plain text."""
+        yield "=" * 70
+        yield f"CONVERSATION: {conversation_data.get('name', 'Untitled')}"
+        yield f"Model: {conversation_data.get('model', 'Unknown')}"
+        yield "=" * 70
+        yield ""
 
         for msg in conversation_data.get("messages", []):
             system = msg.get("system")
@@ -270,16 +440,14 @@ class ExportManager:
             response = msg.get("response", "")
 
             if include_system and system:
-                output.append("-" * 70)
-                output.append("SYSTEM:")
-                output.append(system)
-
-            output.append("-" * 70)
-            output.append("USER:")
-            output.append(prompt)
-            output.append("")
-            output.append("ASSISTANT:")
-            output.append(response)
-            output.append("")
-
-        return "\n".join(output)
+                yield "-" * 70
+                yield "SYSTEM:"
+                yield system
+
+            yield "-" * 70
+            yield "USER:"
+            yield prompt
+            yield ""
+            yield "ASSISTANT:"
+            yield response
+            yield ""
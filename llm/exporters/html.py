@@ -1,5 +1,6 @@
 """HTML export functionality."""
 
+from string import Formatter
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -122,6 +123,36 @@ class HTMLExporter:
 
     def __init__(self, template: Optional[str] = None):
         self.template = template or DEFAULT_TEMPLATE
+        self._parts = self._split_template(self.template)
+
+    @staticmethod
+    def _split_template(template: str) -> Optional[tuple]:
+        """Split a template into the text around its {title} and {content} fields.
+
+        Returns None for templates that need str.format, such as ones with
+        other fields, format specs or conversions.
+        """
+        try:
+            parsed = list(Formatter().parse(template))
+        except ValueError:
+            return None
+        parts = [""]
+        fields = []
+        for literal, field, spec, conversion in parsed:
+            parts[-1] += literal
+            if field is not None:
+                fields.append((field, spec, conversion))
+                parts.append("")
+        if fields != [("title", "", None), ("content", "", None)]:
+            return None
+        return tuple(parts)
+
+    def _render(self, title: str, content: str) -> str:
+        """Fill the template with an escaped title and the content."""
+        if self._parts is None:
+            return self.template.format(title=title, content=content)
+        before_title, before_content, after_content = self._parts
+        return "".join((before_title, title, before_content, content, after_content))
 
     def export_conversation(
         self,
@@ -130,15 +161,17 @@ class HTMLExporter:
     ) -> str:
         """Export conversation to HTML."""
         content_parts = []
+        append = content_parts.append
+        esc = self._escape_html
 
         # Header
-        content_parts.append('<div class="header">')
-        content_parts.append(f'<h1>{self._escape_html(conversation.get("name", "Conversation"))}</h1>')
-        content_parts.append(f'<div class="meta">Model: {self._escape_html(conversation.get("model", "Unknown"))}</div>')
-        content_parts.append(f'<div class="meta">ID: {self._escape_html(conversation.get("id", ""))}</div>')
-        content_parts.append('</div>')
+        append('<div class="header">')
+        append(f'<h1>{esc(conversation.get("name", "Conversation"))}</h1>')
+        append(f'<div class="meta">Model: {esc(conversation.get("model", "Unknown"))}</div>')
+        append(f'<div class="meta">ID: {esc(conversation.get("id", ""))}</div>')
+        append('</div>')
 
-        # Messages
+        # Messages, one string per message block
         for msg in conversation.get("messages", []):
             system = msg.get("system")
             prompt = msg.get("prompt", "")
@@ -147,81 +180,92 @@ class HTMLExporter:
 
             # System message
             if include_system and system:
-                content_parts.append('<div class="message system-message">')
-                content_parts.append('<div class="role">System</div>')
-                content_parts.append(f'<div class="content">{self._escape_html(system)}</div>')
-                content_parts.append('</div>')
+                append(
+                    '<div class="message system-message">\n'
+                    '<div class="role">System</div>\n'
+                    f'<div class="content">{esc(system)}</div>\n'
+                    '</div>'
+                )
 
             # User message
             if prompt:
-                content_parts.append('<div class="message user-message">')
-                content_parts.append('<div class="role">User</div>')
-                content_parts.append(f'<div class="content">{self._escape_html(prompt)}</div>')
+                timestamp_html = ''
                 if timestamp:
-                    content_parts.append(f'<div class="timestamp">{self._escape_html(timestamp)}</div>')
-                content_parts.append('</div>')
+                    timestamp_html = f'<div class="timestamp">{esc(timestamp)}</div>\n'
+                append(
+                    '<div class="message user-message">\n'
+                    '<div class="role">User</div>\n'
+                    f'<div class="content">{esc(prompt)}</div>\n'
+                    f'{timestamp_html}'
+                    '</div>'
+                )
 
             # Assistant message
             if response:
-                content_parts.append('<div class="message assistant-message">')
-                content_parts.append('<div class="role">Assistant</div>')
-                content_parts.append(f'<div class="content">{self._escape_html(response)}</div>')
-                content_parts.append('</div>')
+                append(
+                    '<div class="message assistant-message">\n'
+                    '<div class="role">Assistant</div>\n'
+                    f'<div class="content">{esc(response)}</div>\n'
+                    '</div>'
+                )
 
         content = '\n'.join(content_parts)
         title = conversation.get("name", "Conversation")
 
-        return self.template.format(title=self._escape_html(title), content=content)
+        return self._render(esc(title), content)
 
     def export_comparison(self, comparison: Dict[str, Any]) -> str:
         """Export model comparison to HTML."""
         content_parts = []
+        append = content_parts.append
+        esc = self._escape_html
 
         # Header
-        content_parts.append('<div class="header">')
-        content_parts.append('<h1>Model Comparison</h1>')
-        content_parts.append(f'<div class="meta">Prompt: {self._escape_html(comparison.get("prompt", ""))}</div>')
-        content_parts.append(f'<div class="meta">Models: {", ".join(comparison.get("models", []))}</div>')
-        content_parts.append(f'<div class="meta">Created: {self._escape_html(comparison.get("created_at", ""))}</div>')
-        content_parts.append('</div>')
+        append('<div class="header">')
+        append('<h1>Model Comparison</h1>')
+        append(f'<div class="meta">Prompt: {esc(comparison.get("prompt", ""))}</div>')
+        append(f'<div class="meta">Models: {esc(", ".join(comparison.get("models", [])))}</div>')
+        append(f'<div class="meta">Created: {esc(comparison.get("created_at", ""))}</div>')
+        append('</div>')
 
         # Responses
-        content_parts.append('<div class="comparison">')
-        for response in comparison.get("responses", []):
-            content_parts.append('<div class="model-response">')
-            content_parts.append(f'<div class="model-name">{self._escape_html(response.get("model", ""))}</div>')
+        responses = comparison.get("responses", [])
+        append('<div class="comparison">')
+        for response in responses:
+            append('<div class="model-response">')
+            append(f'<div class="model-name">{esc(response.get("model", ""))}</div>')
 
             if response.get("success"):
                 # Metrics
-                content_parts.append('<div class="metrics">')
-                content_parts.append(f'<span class="metric">Time: {response.get("time", 0):.2f}s</span>')
-                content_parts.append(f'<span class="metric">Tokens: {response.get("tokens", {}).get("total", 0)}</span>')
-                content_parts.append(f'<span class="metric">Cost: ${response.get("cost", 0):.4f}</span>')
-                content_parts.append('</div>')
+                append('<div class="metrics">')
+                append(f'<span class="metric">Time: {response.get("time", 0):.2f}s</span>')
+                append(f'<span class="metric">Tokens: {response.get("tokens", {}).get("total", 0)}</span>')
+                append(f'<span class="metric">Cost: ${response.get("cost", 0):.4f}</span>')
+                append('</div>')
 
                 # Response text
-                content_parts.append(f'<div class="content">{self._escape_html(response.get("text", ""))}</div>')
+                append(f'<div class="content">{esc(response.get("text", ""))}</div>')
             else:
-                content_parts.append(f'<div class="content" style="color: #d32f2f;">Error: {self._escape_html(response.get("error", "Unknown error"))}</div>')
+                append(f'<div class="content" style="color: #d32f2f;">Error: {esc(response.get("error", "Unknown error"))}</div>')
 
-            content_parts.append('</div>')
-        content_parts.append('</div>')
+            append('</div>')
+        append('</div>')
 
         # Summary
-        successful = [r for r in comparison.get("responses", []) if r.get("success")]
+        successful = [r for r in responses if r.get("success")]
         if successful:
             fastest = min(successful, key=lambda r: r.get("time", float('inf')))
             cheapest = min(successful, key=lambda r: r.get("cost", float('inf')))
 
-            content_parts.append('<div class="summary">')
-            content_parts.append('<h2>Summary</h2>')
-            content_parts.append(f'<div>Fastest: {fastest["model"]} ({fastest.get("time", 0):.2f}s)</div>')
-            content_parts.append(f'<div>Cheapest: {cheapest["model"]} (${cheapest.get("cost", 0):.4f})</div>')
-            content_parts.append('</div>')
+            append('<div class="summary">')
+            append('<h2>Summary</h2>')
+            append(f'<div>Fastest: {esc(fastest["model"])} ({fastest.get("time", 0):.2f}s)</div>')
+            append(f'<div>Cheapest: {esc(cheapest["model"])} (${cheapest.get("cost", 0):.4f})</div>')
+            append('</div>')
 
         content = '\n'.join(content_parts)
 
-        return self.template.format(title="Model Comparison", content=content)
+        return self._render("Model Comparison", content)
 
     def _escape_html(self, text: str) -> str:
         """Escape HTML special characters."""
@@ -1,5 +1,6 @@
 """Markdown export functionality."""
 
+import io
 from typing import Dict, Any
 
 
@@ -12,39 +13,46 @@ class MarkdownExporter:
         include_system: bool = True
     ) -> str:
         """Export conversation to Markdown."""
-        output = []
+        # Message texts are written to the buffer as they are, without first
+        # being copied into "\n"-terminated fragments, so separators are
+        # written ahead of the part they precede
+        buf = io.StringIO()
+        write = buf.write
 
         # Header
-        output.append(f"# {conversation.get('name', 'Conversation')}\n")
-        output.append(f"**Model:** {conversation.get('model', 'Unknown')}  ")
-        output.append(f"**ID:** {conversation.get('id', '')}  ")
-        output.append("")
+        write(f"# {conversation.get('name', 'Conversation')}\n\n")
+        write(f"**Model:** {conversation.get('model', 'Unknown')}  \n")
+        write(f"**ID:** {conversation.get('id', '')}  \n")
 
         # Messages
-        for i, msg in enumerate(conversation.get("messages", []), 1):
+        for msg in conversation.get("messages", []):
             system = msg.get("system")
             prompt = msg.get("prompt", "")
             response = msg.get("response", "")
             timestamp = msg.get("datetime_utc", "")
 
-            output.append("---\n")
+            write("\n---\n")
 
             # System message
             if include_system and system:
-                output.append("### 🔧 System\n")
-                output.append(f"```\n{system}\n```\n")
+                write("\n### 🔧 System\n\n```\n")
+                write(system)
+                write("\n```\n")
 
             # User message
             if prompt:
-                output.append(f"### 👤 User{' (' + timestamp + ')' if timestamp else ''}\n")
-                output.append(f"{prompt}\n")
+                when = f" ({timestamp})" if timestamp else ""
+                write(f"\n### 👤 User{when}\n\n")
+                write(prompt)
+                write("\n")
 
             # Assistant message
             if response:
-                output.append("### 🤖 Assistant\n")
-                output.append(f"{response}\n")
+                write("\n### 🤖 Assistant\n\n")
+                write(response)
+                write("\n")
 
-        return "\n".join(output)
+        return buf.getvalue()
 
     def export_comparison(self, comparison: Dict[str, Any]) -> str:
         """Export model comparison to Markdown."""
@@ -418,3 +418,12 @@ def m020_tool_results_attachments(db):
 @migration
 def m021_tool_results_exception(db):
     db["tool_results"].add_column("exception", str)
+
+
+@migration
+def m022_responses_conversation_id_datetime_index(db):
+    # Lets a conversation's responses be read in order without a sort, and
+    # also serves lookups by conversation_id alone
+    db["responses"].create_index(
+        ["conversation_id", "datetime_utc"], if_not_exists=True
+    )
@@ -6,12 +6,30 @@ Compare responses from multiple models side-by-side.
 
 import json
 import sqlite3
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 from llm import get_model, user_dir
+from llm.cost_tracking import CostTracker
+from llm.utils import connect_shared_db
+
+# Most models to prompt at once, so long model lists don't open a thread and
+# a connection per model
+MAX_CONCURRENT_MODELS = 16
+
+INSERT_COMPARISON_SQL = """
+    INSERT INTO comparisons (
+        id, created_at, prompt, system_prompt, models, responses, metrics
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Columns stored as JSON, which are decoded when a comparison is read back
+JSON_COLUMNS = ("models", "responses", "metrics")
 
 
 class ModelComparison:
@@ -21,13 +39,20 @@ class ModelComparison:
         if db_path is None:
             db_path = user_dir() / "comparisons.db"
         self.db_path = db_path
+        # Created on first use, then shared by every model's thread
+        self._cost_tracker: Optional[CostTracker] = None
+        self._cost_tracker_lock = threading.Lock()
+        # Serializes writes on the shared connection
+        self._lock = threading.Lock()
         self._init_db()
 
     def _init_db(self):
-        """Initialize the comparisons database."""
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-
-        conn = sqlite3.connect(str(self.db_path))
+        """Initialize the comparisons database and open the shared connection."""
+        conn = connect_shared_db(self.db_path)
+        self._conn = conn
+        # Closes the connection when the comparison is closed or garbage
+        # collected, or at exit, without keeping the comparison itself alive
+        self._finalizer = weakref.finalize(self, conn.close)
 
         conn.execute("""
             CREATE TABLE IF NOT EXISTS comparisons (
@@ -41,9 +66,27 @@ class ModelComparison:
                 notes TEXT
             )
         """)
+        # list_comparisons reads the newest first
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_comparisons_created_at
+            ON comparisons(created_at DESC)
+        """)
 
         conn.commit()
-        conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection and the shared cost tracker."""
+        with self._cost_tracker_lock:
+            if self._cost_tracker is not None:
+                self._cost_tracker.close()
+                self._cost_tracker = None
+        self._finalizer()
 
     def compare(
         self,
@@ -61,70 +104,20 @@ class ModelComparison:
         responses = []
         metrics = {}
 
-        for model_name in models:
-            try:
-                model = get_model(model_name)
-
-                start_time = time.time()
-                response = model.prompt(prompt, system=system)
-                end_time = time.time()
-
-                response_time = end_time - start_time
-                response_text = response.text()
-
-                # Get token usage if available
-                input_tokens = getattr(response, 'input_tokens', 0) if hasattr(response, 'input_tokens') else 0
-                output_tokens = getattr(response, 'output_tokens', 0) if hasattr(response, 'output_tokens') else 0
-
-                # Calculate cost if we have token info
-                cost = 0.0
-                if hasattr(response, 'input_tokens') and hasattr(response, 'output_tokens'):
-                    from llm.cost_tracking import CostTracker
-                    tracker = CostTracker()
-                    cost = tracker.calculate_cost(model_name, input_tokens, output_tokens)
-
-                response_data = {
-                    'model': model_name,
-                    'text': response_text,
-                    'time': response_time,
-                    'tokens': {
-                        'input': input_tokens,
-                        'output': output_tokens,
-                        'total': input_tokens + output_tokens
-                    },
-                    'cost': cost,
-                    'success': True,
-                    'error': None
-                }
-
-                responses.append(response_data)
-
-                metrics[model_name] = {
-                    'time': response_time,
-                    'tokens': input_tokens + output_tokens,
-                    'cost': cost,
-                    'length': len(response_text)
-                }
-
-            except Exception as e:
-                response_data = {
-                    'model': model_name,
-                    'text': None,
-                    'time': 0,
-                    'tokens': {'input': 0, 'output': 0, 'total': 0},
-                    'cost': 0,
-                    'success': False,
-                    'error': str(e)
-                }
-                responses.append(response_data)
-
-                metrics[model_name] = {
-                    'time': 0,
-                    'tokens': 0,
-                    'cost': 0,
-                    'length': 0,
-                    'error': str(e)
-                }
+        # Each model call is independent network I/O, so run them concurrently.
+        # executor.map() yields results in the order the models were given.
+        if models:
+            max_workers = min(len(models), MAX_CONCURRENT_MODELS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for model_name, (response_data, model_metrics) in zip(
+                    models,
+                    executor.map(
+                        lambda model_name: self._run_model(model_name, prompt, system),
+                        models
+                    )
+                ):
+                    responses.append(response_data)
+                    metrics[model_name] = model_metrics
 
         comparison = {
             'id': comparison_id,
@@ -141,66 +134,139 @@ class ModelComparison:
 
         return comparison
 
-    def _save_comparison(self, comparison: Dict[str, Any]):
-        """Save a comparison to the database."""
-        conn = sqlite3.connect(str(self.db_path))
+    def _get_cost_tracker(self) -> CostTracker:
+        """Get the cost tracker, creating it the first time it is needed."""
+        with self._cost_tracker_lock:
+            if self._cost_tracker is None:
+                self._cost_tracker = CostTracker()
+            return self._cost_tracker
 
-        conn.execute("""
-            INSERT INTO comparisons (
-                id, created_at, prompt, system_prompt, models, responses, metrics
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            comparison['id'],
-            comparison['created_at'],
-            comparison['prompt'],
-            comparison['system_prompt'],
-            json.dumps(comparison['models']),
-            json.dumps(comparison['responses']),
-            json.dumps(comparison['metrics'])
-        ))
+    def _run_model(
+        self,
+        model_name: str,
+        prompt: str,
+        system: Optional[str]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Run the prompt against one model, returning (response_data, metrics)."""
+        try:
+            model = get_model(model_name)
+
+            start_time = time.time()
+            response = model.prompt(prompt, system=system)
+            # Responses are lazy, so the request is only made by .text()
+            response_text = response.text()
+            end_time = time.time()
+
+            response_time = end_time - start_time
+
+            # Get token usage if available. Models that don't report usage
+            # leave these as None
+            try:
+                input_tokens = response.input_tokens or 0
+                output_tokens = response.output_tokens or 0
+                has_tokens = True
+            except AttributeError:
+                input_tokens = output_tokens = 0
+                has_tokens = False
+
+            # Calculate cost if we have token info
+            cost = 0.0
+            if has_tokens:
+                tracker = self._get_cost_tracker()
+                cost = tracker.calculate_cost(model_name, input_tokens, output_tokens)
+
+            response_data = {
+                'model': model_name,
+                'text': response_text,
+                'time': response_time,
+                'tokens': {
+                    'input': input_tokens,
+                    'output': output_tokens,
+                    'total': input_tokens + output_tokens
+                },
+                'cost': cost,
+                'success': True,
+                'error': None
+            }
+
+            return response_data, {
+                'time': response_time,
+                'tokens': input_tokens + output_tokens,
+                'cost': cost,
+                'length': len(response_text)
+            }
+
+        except Exception as e:
+            response_data = {
+                'model': model_name,
+                'text': None,
+                'time': 0,
+                'tokens': {'input': 0, 'output': 0, 'total': 0},
+                'cost': 0,
+                'success': False,
+                'error': str(e)
+            }
+
+            return response_data, {
+                'time': 0,
+                'tokens': 0,
+                'cost': 0,
+                'length': 0,
+                'error': str(e)
+            }
 
-        conn.commit()
-        conn.close()
+    def _save_comparison(self, comparison: Dict[str, Any]):
+        """Save a comparison to the database."""
+        with self._lock, self._conn:
+            self._conn.execute(INSERT_COMPARISON_SQL, (
+                comparison['id'],
+                comparison['created_at'],
+                comparison['prompt'],
+                comparison['system_prompt'],
+                # Compact separators: responses can hold long texts, and
+                # this JSON is only read back by this module
+                json.dumps(comparison['models'], separators=(",", ":")),
+                json.dumps(comparison['responses'], separators=(",", ":")),
+                json.dumps(comparison['metrics'], separators=(",", ":"))
+            ))
 
     def get_comparison(self, comparison_id: str) -> Optional[Dict[str, Any]]:
         """Get a saved comparison by ID."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.execute(
+        cursor = self._conn.execute(
             "SELECT * FROM comparisons WHERE id = ?", (comparison_id,)
         )
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             return None
 
-        comparison = dict(row)
-        comparison['models'] = json.loads(comparison['models'])
-        comparison['responses'] = json.loads(comparison['responses'])
-        comparison['metrics'] = json.loads(comparison['metrics'])
-
-        return comparison
-
-    def list_comparisons(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """List recent comparisons."""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.execute(
-            "SELECT * FROM comparisons ORDER BY created_at DESC LIMIT ?", (limit,)
+        return self._row_to_comparison(row)
+
+    def list_comparisons(
+        self, limit: int = 10, include_results: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        List recent comparisons.
+
+        With include_results=False the responses and metrics columns, which
+        hold every model's full output, are neither read nor decoded.
+        """
+        columns = "*"
+        if not include_results:
+            columns = "id, created_at, prompt, system_prompt, models, notes"
+        cursor = self._conn.execute(
+            f"SELECT {columns} FROM comparisons ORDER BY created_at DESC LIMIT ?",
+            (limit,)
         )
-        comparisons = []
-        for row in cursor.fetchall():
-            comp = dict(row)
-            comp['models'] = json.loads(comp['models'])
-            comp['responses'] = json.loads(comp['responses'])
-            comp['metrics'] = json.loads(comp['metrics'])
-            comparisons.append(comp)
+        return [self._row_to_comparison(row) for row in cursor.fetchall()]
 
-        conn.close()
-        return comparisons
+    def _row_to_comparison(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a comparisons row to a dict, decoding its JSON columns."""
+        comparison = dict(row)
+        for column in JSON_COLUMNS:
+            if column in comparison:
+                comparison[column] = json.loads(comparison[column])
+        return comparison
 
     def get_best_model(self, comparison: Dict[str, Any], criteria: str = "cost") -> str:
         """Get the best model from a comparison based on criteria."""
@@ -223,40 +289,42 @@ class ModelComparison:
     def format_comparison_text(self, comparison: Dict[str, Any], show_metrics: bool = True) -> str:
         """Format comparison as text for display."""
         output = []
+        append = output.append
 
-        output.append("=" * 70)
-        output.append("MODEL COMPARISON")
-        output.append("=" * 70)
-        output.append(f"Prompt: {comparison['prompt']}")
-        output.append(f"Models: {', '.join(comparison['models'])}")
-        output.append(f"Time: {comparison['created_at']}")
-        output.append("")
+        append("=" * 70)
+        append("MODEL COMPARISON")
+        append("=" * 70)
+        append(f"Prompt: {comparison['prompt']}")
+        append(f"Models: {', '.join(comparison['models'])}")
+        append(f"Time: {comparison['created_at']}")
+        append("")
 
         for response in comparison['responses']:
-            output.append("─" * 70)
-            output.append(f"MODEL: {response['model']}")
+            success = response['success']
+            append("─" * 70)
+            append(f"MODEL: {response['model']}")
 
             if show_metrics:
-                if response['success']:
-                    output.append(f"Time: {response['time']:.2f}s | "
-                                  f"Tokens: {response['tokens']['total']} | "
-                                  f"Cost: ${response['cost']:.4f}")
+                if success:
+                    append(f"Time: {response['time']:.2f}s | "
+                           f"Tokens: {response['tokens']['total']} | "
+                           f"Cost: ${response['cost']:.4f}")
                 else:
-                    output.append(f"ERROR: {response['error']}")
+                    append(f"ERROR: {response['error']}")
 
-            output.append("─" * 70)
+            append("─" * 70)
 
-            if response['success']:
-                output.append(response['text'] or '')
+            if success:
+                append(response['text'] or '')
             else:
-                output.append(f"[Failed: {response['error']}]")
+                append(f"[Failed: {response['error']}]")
 
-            output.append("")
+            append("")
 
         if show_metrics:
-            output.append("=" * 70)
-            output.append("SUMMARY")
-            output.append("=" * 70)
+            append("=" * 70)
+            append("SUMMARY")
+            append("=" * 70)
 
             successful = [r for r in comparison['responses'] if r['success']]
             if successful:
@@ -264,8 +332,8 @@ class ModelComparison:
                 cheapest = min(successful, key=lambda r: r['cost'])
                 longest = max(successful, key=lambda r: len(r['text'] or ''))
 
-                output.append(f"Fastest: {fastest['model']} ({fastest['time']:.2f}s)")
-                output.append(f"Cheapest: {cheapest['model']} (${cheapest['cost']:.4f})")
-                output.append(f"Longest response: {longest['model']} ({len(longest['text'])} chars)")
+                append(f"Fastest: {fastest['model']} ({fastest['time']:.2f}s)")
+                append(f"Cheapest: {cheapest['model']} (${cheapest['cost']:.4f})")
+                append(f"Longest response: {longest['model']} ({len(longest['text'])} chars)")
 
         return "\n".join(output)
@@ -47,7 +47,9 @@ class TreeNavigator:
 
         for branch in branches:
             branch["children"] = []
-            branch["message_count"] = self._get_message_count(branch["id"])
+            # Stored by BranchManager, but counted for databases it hasn't upgraded
+            if branch.get("message_count") is None:
+                branch["message_count"] = self._get_message_count(branch["id"])
 
             parent_id = branch["parent_branch_id"]
             if parent_id and parent_id in id_to_branch:
@@ -193,25 +195,34 @@ class TreeNavigator:
         prefix: str = "",
         is_last: bool = True
     ):
-        """Format a single branch node with its children."""
-        # Determine connector
-        connector = "└─ " if is_last else "├─ "
-
-        # Format branch info
-        branch_info = f"{branch['branch_name']} ({branch['message_count']} messages)"
-        if branch.get("description"):
-            branch_info += f" - {branch['description']}"
-
-        output.append(f"{prefix}{connector}{branch_info}")
-
-        # Prepare prefix for children
-        child_prefix = prefix + ("   " if is_last else "│  ")
-
-        # Recursively format children
-        children = branch.get("children", [])
-        for i, child in enumerate(children):
-            is_last_child = (i == len(children) - 1)
-            self._format_branch_node(child, output, child_prefix, is_last_child)
+        """
+        Format a branch node and all of its descendants.
+
+        Uses an explicit stack rather than recursion, so deep branch chains
+        cannot hit the recursion limit. Nodes are still output depth-first.
+        """
+        stack = [(branch, prefix, is_last)]
+        while stack:
+            node, node_prefix, node_is_last = stack.pop()
+
+            # Determine connector
+            connector = "└─ " if node_is_last else "├─ "
+
+            # Format branch info
+            branch_info = f"{node['branch_name']} ({node['message_count']} messages)"
+            if node.get("description"):
+                branch_info += f" - {node['description']}"
+
+            output.append(f"{node_prefix}{connector}{branch_info}")
+
+            # Prepare prefix for children
+            child_prefix = node_prefix + ("   " if node_is_last else "│  ")
+
+            # Push children in reverse so the first child is formatted next
+            children = node.get("children", [])
+            last_index = len(children) - 1
+            for i in range(last_index, -1, -1):
+                stack.append((children[i], child_prefix, i == last_index))
 
     def _get_message_count(self, branch_id: str) -> int:
         """Get count of messages in a branch."""
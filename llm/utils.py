@@ -6,6 +6,7 @@ import json
 import pathlib
 import puremagic
 import re
+import sqlite3
 import sqlite_utils
 import textwrap
 from typing import Any, List, Dict, Optional, Tuple, Type
@@ -477,6 +478,17 @@ def truncate_string(
 
 
 def ensure_fragment(db, content):
+    with db.conn:
+        return insert_fragment(db, content)
+
+
+def insert_fragment(db, content):
+    """
+    Store a fragment if it is not already stored and return its ID.
+
+    Unlike ensure_fragment() this does not commit, so it can take part in a
+    larger transaction managed by the caller.
+    """
     sql = """
     insert into fragments (hash, content, datetime_utc, source)
     values (:hash, :content, datetime('now'), :source)
@@ -486,11 +498,10 @@ def ensure_fragment(db, content):
     source = None
     if isinstance(content, Fragment):
         source = content.source
-    with db.conn:
-        db.execute(sql, {"hash": hash_id, "content": content, "source": source})
-        return list(
-            db.query("select id from fragments where hash = :hash", {"hash": hash_id})
-        )[0]["id"]
+    db.execute(sql, {"hash": hash_id, "content": content, "source": source})
+    return list(
+        db.query("select id from fragments where hash = :hash", {"hash": hash_id})
+    )[0]["id"]
 
 
 def ensure_tool(db, tool):
@@ -515,6 +526,26 @@ def ensure_tool(db, tool):
         )[0]["id"]
 
 
+def connect_shared_db(
+    db_path: pathlib.Path, cache_size: Optional[int] = None
+) -> sqlite3.Connection:
+    """
+    Open a SQLite connection in WAL mode that can be shared between threads.
+
+    Rows are returned as sqlite3.Row. Callers serialize their own writes and
+    are responsible for closing the connection.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if cache_size is not None:
+        conn.execute(f"PRAGMA cache_size={int(cache_size)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
 def maybe_fenced_code(content: str) -> str:
     "Return the content as a fenced code block if it looks like code"
     is_code = False
@@ -97,6 +97,15 @@ def test_load_from_json_with_template(processor, json_file):
     assert prompts[1]["prompt"] == "Bob should Write tests"
 
 
+def test_apply_template(processor):
+    """Test template substitution leaves unknown placeholders alone."""
+    template = "{first name} is {age} - {unknown} {name}"
+    data = {"first name": "Alice", "age": 30, "name": "{age}"}
+
+    # Substituted values are not scanned again for placeholders
+    assert processor._apply_template(template, data) == "Alice is 30 - {unknown} {age}"
+
+
 def test_load_from_jsonl(processor, jsonl_file):
     """Test loading prompts from JSONL file."""
     prompts = list(processor.load_prompts_from_file(jsonl_file))
@@ -349,3 +358,101 @@ def test_save_to_json_output(processor, text_file, tmp_path):
             data = json.load(f)
             assert isinstance(data, list)
             assert len(data) == 3
+
+
+def test_process_batch_flushes_in_batches(processor, text_file):
+    """Test that results are written in batch_size chunks and a final flush."""
+    import sqlite3
+
+    with patch('llm.batch_processing.get_model') as mock_get_model:
+        mock_model = Mock()
+        mock_response = Mock()
+        mock_response.text.return_value = "Response"
+        mock_response.input_tokens = 10
+        mock_response.output_tokens = 5
+        mock_model.prompt.return_value = mock_response
+        mock_get_model.return_value = mock_model
+
+        with patch.object(
+            processor, '_flush_results', wraps=processor._flush_results
+        ) as mock_flush:
+            batch_id = processor.process_batch(
+                input_file=text_file,
+                model_name="test-model",
+                batch_size=2
+            )
+        # One flush after two prompts, then a final flush for the third
+        assert mock_flush.call_count == 2
+
+    conn = sqlite3.connect(str(processor.db_path))
+    count = conn.execute(
+        "SELECT COUNT(*) FROM batch_results WHERE batch_id = ?", (batch_id,)
+    ).fetchone()[0]
+    conn.close()
+    assert count == 3
+    status = processor.get_batch_status(batch_id)
+    assert status["completed_prompts"] == 3
+    assert status["status"] == "completed"
+
+
+def test_process_batch_flushes_after_interval(processor, text_file):
+    """Test that buffered results are also written once the interval passes."""
+    with patch('llm.batch_processing.get_model') as mock_get_model, \
+            patch('llm.batch_processing.RESULT_FLUSH_INTERVAL', 0):
+        mock_model = Mock()
+        mock_model.prompt.return_value = Mock(
+            text=lambda: "Response", input_tokens=10, output_tokens=5
+        )
+        mock_get_model.return_value = mock_model
+
+        with patch.object(
+            processor, '_flush_results', wraps=processor._flush_results
+        ) as mock_flush:
+            processor.process_batch(input_file=text_file, model_name="test-model")
+        # One flush per prompt, then the final flush
+        assert mock_flush.call_count == 4
+
+
+def test_process_batch_interrupted_keeps_results(processor, text_file):
+    """Test an interrupted run writes the results it has and is marked failed."""
+    import sqlite3
+
+    with patch('llm.batch_processing.get_model') as mock_get_model:
+        mock_model = Mock()
+        mock_model.prompt.side_effect = [
+            Mock(text=lambda: "Response 1", input_tokens=10, output_tokens=5),
+            Mock(text=lambda: "Response 2", input_tokens=10, output_tokens=5),
+            KeyboardInterrupt(),
+        ]
+        mock_get_model.return_value = mock_model
+
+        with pytest.raises(KeyboardInterrupt):
+            processor.process_batch(input_file=text_file, model_name="test-model")
+
+    batch = processor.list_batches()[0]
+    assert batch["status"] == "failed"
+    assert batch["completed_prompts"] == 2
+    conn = sqlite3.connect(str(processor.db_path))
+    count = conn.execute(
+        "SELECT COUNT(*) FROM batch_results WHERE batch_id = ?", (batch["id"],)
+    ).fetchone()[0]
+    conn.close()
+    assert count == 2
+
+
+def test_process_batch_uses_one_cost_tracker(processor, text_file):
+    """Test every prompt's cost is calculated with one shared tracker."""
+    with patch('llm.batch_processing.get_model') as mock_get_model, \
+            patch('llm.cost_tracking.CostTracker') as tracker_class:
+        mock_model = Mock()
+        mock_model.prompt.return_value = Mock(
+            text=lambda: "Response", input_tokens=10, output_tokens=5
+        )
+        mock_get_model.return_value = mock_model
+        tracker_class.return_value.calculate_cost.return_value = 0.5
+
+        for _ in range(2):
+            processor.process_batch(input_file=text_file, model_name="test-model")
+
+    assert tracker_class.call_count == 1
+    assert tracker_class.return_value.calculate_cost.call_count == 6
@@ -77,3 +77,32 @@ def test_get_run(benchmark_manager):
         assert run is not None
         assert "results" in run
         assert "scores" in run
+
+
+def test_run_benchmark_runs_models_concurrently(benchmark_manager):
+    """Test that models are benchmarked concurrently, keeping their scores."""
+    import threading
+
+    benchmark_manager.create_benchmark(
+        "test-bench", [{"prompt": "Test", "expected": "answer"}]
+    )
+
+    # Both models must be prompted at once for the barrier to release
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_model(model_name):
+        model = Mock()
+
+        def text():
+            barrier.wait()
+            return "answer" if model_name == "right" else "nope"
+
+        model.prompt.return_value = Mock(text=text)
+        return model
+
+    with patch('llm.benchmark_manager.get_model', side_effect=get_model):
+        run_id = benchmark_manager.run_benchmark("test-bench", ["right", "wrong"])
+
+    run = benchmark_manager.get_run(run_id)
+    assert run["scores"]["right"]["accuracy"] == 1.0
+    assert run["scores"]["wrong"]["accuracy"] == 0.0
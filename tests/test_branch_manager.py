@@ -122,3 +122,79 @@ def test_archive_branch(branch_manager):
         # Should appear in full list
         all_branches = branch_manager.list_branches("conv-123", include_inactive=True)
         assert any(b["branch_name"] == "to-archive" for b in all_branches)
+
+
+def test_create_branch_records_messages_in_order(branch_manager):
+    """Branch messages up to the branch point are stored in sequence."""
+    import sqlite3
+
+    with patch.object(branch_manager, '_get_conversation_messages') as mock_get:
+        mock_get.return_value = [
+            {"id": f"msg{i}", "prompt": f"Q{i}", "response": f"A{i}"}
+            for i in range(1, 4)
+        ]
+        branch_id = branch_manager.create_branch("conv-123", "partial", from_message=2)
+
+    conn = sqlite3.connect(str(branch_manager.db_path))
+    rows = conn.execute(
+        "SELECT log_id, sequence FROM branch_messages WHERE branch_id = ? ORDER BY sequence",
+        (branch_id,)
+    ).fetchall()
+    conn.close()
+    assert rows == [("msg1", 0), ("msg2", 1)]
+
+
+def test_visualize_tree_ascii(branch_manager):
+    """Nested branches are drawn depth-first with tree connectors."""
+    from llm.tree_navigator import TreeNavigator
+
+    with patch.object(branch_manager, '_get_conversation_messages') as mock_get:
+        mock_get.return_value = [{"id": "msg1", "prompt": "Q", "response": "A"}]
+        branch_manager.create_branch("conv-123", "main")
+        branch_manager.create_branch("conv-123", "a", parent_branch="main")
+        branch_manager.create_branch("conv-123", "a1", parent_branch="a")
+        branch_manager.create_branch("conv-123", "b", parent_branch="main")
+
+    output = TreeNavigator(branch_manager.db_path).visualize_tree("conv-123")
+
+    assert output.splitlines()[-4:] == [
+        "└─ main (1 messages)",
+        "   ├─ a (1 messages)",
+        "   │  └─ a1 (1 messages)",
+        "   └─ b (1 messages)",
+    ]
+
+
+def test_message_count_backfilled_for_existing_database(user_path):
+    """Branches databases without a message_count column are upgraded."""
+    import sqlite3
+
+    db_path = user_path / "old_branches.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE conversation_branches (
+            id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL,
+            branch_name TEXT NOT NULL, parent_branch_id TEXT,
+            branch_point_log_id TEXT, created_at TEXT NOT NULL,
+            description TEXT, active BOOLEAN DEFAULT 1
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE branch_messages (
+            id TEXT PRIMARY KEY, branch_id TEXT NOT NULL,
+            log_id TEXT NOT NULL, sequence INTEGER NOT NULL
+        )
+    """)
+    conn.execute(
+        "INSERT INTO conversation_branches (id, conversation_id, branch_name, created_at)"
+        " VALUES ('b1', 'conv-123', 'old', '2024-01-01')"
+    )
+    conn.executemany(
+        "INSERT INTO branch_messages VALUES (?, 'b1', ?, ?)",
+        [("m1", "log1", 0), ("m2", "log2", 1)]
+    )
+    conn.commit()
+    conn.close()
+
+    manager = BranchManager(db_path=db_path)
+    assert manager.get_branch("conv-123", "old")["message_count"] == 2
@@ -79,6 +79,25 @@ def test_model_options_clear(user_path):
     assert result2.exit_code == 0
     data = json.loads(path.read_text("utf-8"))
     assert data == {"gpt-4o": {"temperature": 0.7}}
+    # Written atomically via a temporary file, which should not remain
+    assert not (user_path / "model_options.json.tmp").exists()
+
+
+def test_model_options_clear_unknown_does_not_write(user_path):
+    path = user_path / "model_options.json"
+    runner = CliRunner()
+    result = runner.invoke(cli, ["models", "options", "clear", "gpt-4o-mini"])
+    assert result.exit_code == 0
+    assert not path.exists()
+    # Clearing an option that is not set should not rewrite the file
+    path.write_text(json.dumps({"gpt-4o-mini": {"temperature": 0.5}}), "utf-8")
+    mtime_ns = path.stat().st_mtime_ns
+    result2 = runner.invoke(
+        cli, ["models", "options", "clear", "gpt-4o-mini", "top_p"]
+    )
+    assert result2.exit_code == 0
+    assert path.stat().st_mtime_ns == mtime_ns
+    assert path.read_text("utf-8") == '{"gpt-4o-mini": {"temperature": 0.5}}'
 
 
 def test_prompt_uses_model_options(user_path):
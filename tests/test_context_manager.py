@@ -7,7 +7,8 @@ from llm.context_manager import ContextManager
 def context_manager(user_path):
     """Create a ContextManager instance."""
     db_path = user_path / "test_context.db"
-    return ContextManager(db_path=db_path)
+    with ContextManager(db_path=db_path) as manager:
+        yield manager
 
 
 def test_set_limit(context_manager):
@@ -54,3 +55,179 @@ def test_clear(context_manager):
     """Test clearing context."""
     cleared = context_manager.clear("conv-123", keep_recent=5)
     assert isinstance(cleared, int)
+
+
+def test_get_status_token_estimates_cached(context_manager, user_path):
+    """Token estimates are stored per response and only new ones are added."""
+    import sqlite_utils
+
+    db = sqlite_utils.Database(user_path / "logs.db")
+    db["responses"].insert_all(
+        [
+            {"id": "r1", "conversation_id": "conv-1", "prompt": "one two",
+             "response": "three four five"},
+            {"id": "r2", "conversation_id": "conv-2", "prompt": "ignored",
+             "response": "ignored"},
+        ],
+        pk="id",
+    )
+
+    status = context_manager.get_status("conv-1")
+    assert status["current_messages"] == 1
+    assert status["estimated_tokens"] == 5
+
+    db["responses"].insert(
+        {"id": "r3", "conversation_id": "conv-1", "prompt": "six",
+         "response": None}
+    )
+    status = context_manager.get_status("conv-1")
+    assert status["current_messages"] == 2
+    assert status["estimated_tokens"] == 6
+
+
+def test_summarize_only_reads_older_messages(context_manager, user_path):
+    """Summarize reads everything except the most recent messages, oldest first."""
+    import sqlite_utils
+    from unittest.mock import patch
+
+    db = sqlite_utils.Database(user_path / "logs.db")
+    db["responses"].insert_all(
+        [
+            {"id": f"r{i}", "conversation_id": "conv-1", "prompt": f"p{i}",
+             "response": f"a{i}", "datetime_utc": f"2025-01-0{i}T00:00:00"}
+            for i in (3, 1, 4, 2)
+        ],
+        pk="id",
+    )
+
+    assert context_manager.clear("conv-1", keep_recent=1) == 3
+
+    with patch("llm.context_manager.get_model", side_effect=Exception("no model")):
+        summary = context_manager.summarize("conv-1", keep_recent=2, force=True)
+    assert summary == "[2 messages from earlier in conversation]"
+
+    messages = context_manager._get_conversation_messages("conv-1", limit=2)
+    assert [m["prompt"] for m in messages] == ["p1", "p2"]
+
+
+def test_set_limit_and_strategy_keep_each_other(context_manager):
+    """Setting one of limit or strategy does not reset the other."""
+    context_manager.set_strategy("conv-123", "keep_important")
+    context_manager.set_limit("conv-123", 8192)
+
+    status = context_manager.get_status("conv-123")
+    assert status["max_tokens"] == 8192
+    assert status["strategy"] == "keep_important"
+
+    context_manager.set_strategy("conv-123", "summarize_old")
+    status = context_manager.get_status("conv-123")
+    assert status["max_tokens"] == 8192
+    assert status["strategy"] == "summarize_old"
+
+
+def test_summary_model_resolved_once(context_manager):
+    """The summary model is looked up on first use and then reused."""
+    from unittest.mock import patch
+
+    with patch("llm.context_manager.get_model") as get_model:
+        first = context_manager._get_summary_model()
+        second = context_manager._get_summary_model()
+
+    assert first is second
+    get_model.assert_called_once_with("gpt-4o-mini")
+
+
+def test_summarize_long_history_in_chunks(context_manager, user_path):
+    """Long histories are summarized in chunks, then the partial summaries combined."""
+    import sqlite_utils
+    from unittest.mock import Mock, patch
+    from llm.context_manager import SUMMARY_CHUNK_SIZE
+
+    db = sqlite_utils.Database(user_path / "logs.db")
+    db["responses"].insert_all(
+        [
+            {"id": f"r{i:03d}", "conversation_id": "conv-1", "prompt": f"p{i}",
+             "response": f"a{i}", "datetime_utc": f"2025-01-01T00:00:{i:03d}"}
+            for i in range(SUMMARY_CHUNK_SIZE * 2 + 5)
+        ],
+        pk="id",
+    )
+
+    model = Mock()
+    model.prompt.return_value.text.return_value = "partial"
+    with patch("llm.context_manager.get_model", return_value=model):
+        summary = context_manager.summarize("conv-1", keep_recent=5, force=True)
+
+    assert summary == "partial"
+    # Two chunks of history, then one prompt combining their summaries
+    assert model.prompt.call_count == 3
+    final_prompt = model.prompt.call_args_list[-1].args[0]
+    assert "Part 1: partial" in final_prompt
+    assert "Part 2: partial" in final_prompt
+
+
+def test_get_status_zero_limit_uses_default(context_manager):
+    """A stored limit of 0 falls back to the default instead of dividing by zero."""
+    context_manager.set_limit("conv-123", 0)
+
+    status = context_manager.get_status("conv-123")
+    assert status["max_tokens"] == 4096
+    assert status["percentage_used"] == 0.0
+
+
+def test_conversation_messages_cached_until_changed(context_manager, user_path):
+    """Messages are reused until a response is added to the conversation."""
+    import sqlite_utils
+
+    db = sqlite_utils.Database(user_path / "logs.db")
+    db["responses"].insert(
+        {"id": "r1", "conversation_id": "conv-1", "prompt": "p1", "response": "a1",
+         "datetime_utc": "2025-01-01T00:00:01"},
+        pk="id",
+    )
+
+    first = context_manager._get_conversation_messages("conv-1")
+    assert context_manager._get_conversation_messages("conv-1") is first
+
+    db["responses"].insert(
+        {"id": "r2", "conversation_id": "conv-1", "prompt": "p2", "response": "a2",
+         "datetime_utc": "2025-01-01T00:00:02"}
+    )
+    messages = context_manager._get_conversation_messages("conv-1")
+    assert [m["prompt"] for m in messages] == ["p1", "p2"]
+
+
+def test_summarize_skipped_when_well_within_limit(context_manager, user_path):
+    """The summary model is only called once the conversation nears its limit."""
+    import sqlite_utils
+    from unittest.mock import Mock, patch
+
+    db = sqlite_utils.Database(user_path / "logs.db")
+    db["responses"].insert_all(
+        [
+            {"id": f"r{i}", "conversation_id": "conv-1", "prompt": "one two three",
+             "response": "four five", "datetime_utc": f"2025-01-01T00:00:0{i}"}
+            for i in range(6)
+        ],
+        pk="id",
+    )
+    model = Mock()
+    model.prompt.return_value.text.return_value = "summary"
+
+    # 6 messages of 5 words each is 30 tokens, well under half of the default 4096
+    with patch("llm.context_manager.get_model", return_value=model):
+        assert context_manager.summarize("conv-1", keep_recent=2) == "No summarization needed"
+        model.prompt.assert_not_called()
+
+        context_manager.set_limit("conv-1", 40)
+        assert context_manager.summarize("conv-1", keep_recent=2) == "summary"
+
+
+def test_close(context_manager):
+    """Test close() closes the connection and can be called again."""
+    import sqlite3
+
+    context_manager.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        context_manager._conn.execute("SELECT 1")
+    context_manager.close()
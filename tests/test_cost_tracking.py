@@ -8,7 +8,8 @@ from llm.cost_tracking import CostTracker
 def tracker(user_path):
     """Create a CostTracker instance with test database."""
     db_path = user_path / "test_costs.db"
-    return CostTracker(db_path=db_path)
+    with CostTracker(db_path=db_path) as tracker:
+        yield tracker
 
 
 def test_calculate_cost_gpt4o(tracker):
@@ -35,6 +36,19 @@ def test_calculate_cost_unknown_model(tracker):
     assert abs(cost - expected) < 0.0001
 
 
+def test_refresh_pricing(tracker):
+    """Test pricing changes take effect after refresh_pricing."""
+    with tracker._conn:
+        tracker._conn.execute(
+            "UPDATE pricing SET input_cost_per_1k = 0.01, output_cost_per_1k = 0.02 "
+            "WHERE model = 'gpt-4o'"
+        )
+    # Served from the in-memory cache until refreshed
+    assert abs(tracker.calculate_cost("gpt-4o", 1000, 1000) - 0.0125) < 0.0001
+    tracker.refresh_pricing()
+    assert abs(tracker.calculate_cost("gpt-4o", 1000, 1000) - 0.03) < 0.0001
+
+
 def test_log_cost(tracker):
     """Test logging a cost entry."""
     cost_id = tracker.log_cost(
@@ -262,3 +276,133 @@ def test_spending_periods(tracker):
         assert "total_cost" in spending
         assert "period" in spending
         assert spending["period"] == period
+
+
+def test_log_cost_batches_inserts(tracker):
+    """Test logged costs are held until flushed, then written together."""
+    tracker._last_flush = float("inf")
+    tracker.log_cost("gpt-4o", 1000, 1000)
+    tracker.log_cost("gpt-4o", 1000, 1000)
+
+    def count_rows():
+        return tracker._conn.execute("SELECT COUNT(*) FROM costs").fetchone()[0]
+
+    assert count_rows() == 0
+    tracker.flush()
+    assert count_rows() == 2
+
+
+def test_get_spending_includes_pending_costs(tracker):
+    """Test spending reads see costs that have not been flushed yet."""
+    tracker._last_flush = float("inf")
+    tracker.log_cost("gpt-4o", 1000, 1000)
+
+    assert tracker.get_spending(period="all")["total_prompts"] == 1
+
+
+def test_flush_checks_budgets(tracker):
+    """Test budget alerts are created when pending costs are written."""
+    tracker.set_budget(name="Small", amount=0.01, alert_threshold=0.5)
+    tracker._last_flush = float("inf")
+    tracker.log_cost("gpt-4o", 1000, 1000)  # ~$0.0125
+    tracker.flush()
+
+    alerts = tracker._conn.execute("SELECT alert_type FROM budget_alerts").fetchall()
+    assert [alert[0] for alert in alerts] == ["limit_reached"]
+
+
+def test_check_budgets_by_category(tracker):
+    """Test budget checks only count spending in each budget's category."""
+    tracker.set_budget(name="Model", amount=0.01, period="daily",
+                       category="model", category_value="gpt-4o")
+    tracker.set_budget(name="Project", amount=0.01, period="yearly",
+                       category="project", category_value="project-a")
+    tracker.set_budget(name="Global", amount=1.0, period="monthly")
+    tracker.log_cost("gpt-4o", 1000, 1000, project="project-a")  # ~$0.0125
+    tracker.log_cost("gpt-4o-mini", 1000, 1000, project="project-a")
+    tracker.flush()
+
+    rows = tracker._conn.execute(
+        "SELECT budgets.name, budget_alerts.spent FROM budget_alerts "
+        "JOIN budgets ON budgets.id = budget_alerts.budget_id"
+    ).fetchall()
+    spent = {name: spent for name, spent in rows}
+    assert set(spent) == {"Model", "Project"}
+    assert abs(spent["Model"] - 0.0125) < 0.0001
+    assert spent["Project"] > spent["Model"]
+
+
+@pytest.mark.parametrize(
+    "period,expected_start",
+    [
+        ("today", "2024-03-15T00:00:00"),
+        ("week", "2024-03-08T10:30:45.123456"),
+        ("month", "2024-03-01T00:00:00"),
+        ("year", "2024-01-01T00:00:00"),
+        ("all", "2000-01-01"),
+    ],
+)
+def test_period_range(tracker, period, expected_start):
+    """Test the start and end of each spending period."""
+    now = datetime(2024, 3, 15, 10, 30, 45, 123456)
+    assert tracker._period_range(period, now) == (expected_start, now.isoformat())
+
+
+def test_close_writes_pending_costs(tracker):
+    """Test close() writes pending costs and closes the connection."""
+    import sqlite3
+
+    tracker._last_flush = float("inf")
+    tracker.log_cost(model="gpt-4o", input_tokens=100, output_tokens=50)
+    with tracker:
+        pass
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        tracker._conn.execute("SELECT 1")
+    conn = sqlite3.connect(str(tracker.db_path))
+    assert conn.execute("SELECT COUNT(*) FROM costs").fetchone()[0] == 1
+    conn.close()
+    # Closing again does nothing
+    tracker.close()
+
+
+def test_tracker_is_not_kept_alive(user_path):
+    """Test an unreferenced tracker is collected, writing its pending costs."""
+    import gc
+    import sqlite3
+    import weakref
+
+    tracker = CostTracker(db_path=user_path / "test_costs.db")
+    tracker.set_budget(name="Small", amount=0.01, alert_threshold=0.5)
+    tracker._last_flush = float("inf")
+    tracker.log_cost("gpt-4o", 1000, 1000)  # ~$0.0125
+    ref = weakref.ref(tracker)
+    del tracker
+    gc.collect()
+
+    assert ref() is None
+    conn = sqlite3.connect(str(user_path / "test_costs.db"))
+    assert conn.execute("SELECT COUNT(*) FROM costs").fetchone()[0] == 1
+    # Budgets are checked as the pending cost is written
+    alerts = conn.execute("SELECT alert_type FROM budget_alerts").fetchall()
+    assert [alert[0] for alert in alerts] == ["limit_reached"]
+    conn.close()
+
+
+def test_open_trackers_closed_at_exit(tracker):
+    """Test trackers still open at exit flush pending costs and check budgets."""
+    import sqlite3
+    from llm.cost_tracking import _close_open_trackers
+
+    tracker.set_budget(name="Small", amount=0.01, alert_threshold=0.5)
+    tracker._last_flush = float("inf")
+    tracker.log_cost("gpt-4o", 1000, 1000)  # ~$0.0125
+    _close_open_trackers()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        tracker._conn.execute("SELECT 1")
+    conn = sqlite3.connect(str(tracker.db_path))
+    assert conn.execute("SELECT COUNT(*) FROM costs").fetchone()[0] == 1
+    alerts = conn.execute("SELECT alert_type FROM budget_alerts").fetchall()
+    assert [alert[0] for alert in alerts] == ["limit_reached"]
+    conn.close()
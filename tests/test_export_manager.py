@@ -69,6 +69,31 @@ def test_export_nonexistent_conversation(export_manager):
             export_manager.export_conversation("nonexistent", "html")
 
 
+@pytest.mark.parametrize("output_format", ["text", "json"])
+def test_export_conversation_file_matches_string(export_manager, tmp_path, output_format):
+    """Test conversations written to a file match the returned string."""
+    with patch.object(export_manager, '_get_conversation_data') as mock_get:
+        mock_get.return_value = {
+            "id": "test-123",
+            "name": "Test",
+            "model": "gpt-4o",
+            "messages": [
+                {"id": "1", "prompt": "Hi", "response": "Hello", "system": "Be nice"},
+                {"id": "2", "prompt": "Bye", "response": "Goodbye", "system": None},
+            ]
+        }
+
+        content = export_manager.export_conversation("test-123", output_format)
+        output_file = tmp_path / "conversation.out"
+        export_manager.export_conversation("test-123", output_format, output_file=output_file)
+
+    assert output_file.read_text() == content
+    if output_format == "text":
+        assert content.startswith("=" * 70 + "\nCONVERSATION: Test\n")
+        assert "SYSTEM:\nBe nice" in content
+        assert content.endswith("ASSISTANT:\nGoodbye\n")
+
+
 def test_export_comparison_html(export_manager):
     """Test exporting comparison to HTML."""
     with patch.object(export_manager, '_get_comparison_data') as mock_get:
@@ -90,6 +115,26 @@ def test_export_comparison_html(export_manager):
         assert "model2" in result
 
 
+def test_export_comparison_json(export_manager):
+    """Test exporting a comparison to indented JSON."""
+    import json
+
+    comparison = {
+        "id": "comp-123",
+        "prompt": "Test prompt",
+        "models": ["gpt-4o", "claude-3"],
+        "responses": {"gpt-4o": "Caf\u00e9", "claude-3": "Response 2"},
+        "metrics": {"gpt-4o": {"tokens": 10}},
+    }
+    with patch.object(export_manager, '_get_comparison_data') as mock_get:
+        mock_get.return_value = comparison
+        result = export_manager.export_comparison("comp-123", "json")
+
+    assert json.loads(result) == comparison
+    assert result.startswith('{\n  "id": "comp-123",\n')
+    assert '"Caf\\u00e9"' in result
+
+
 def test_export_batch_csv(export_manager, tmp_path):
     """Test exporting batch results to CSV."""
     with patch.object(export_manager, '_get_batch_data') as mock_get:
@@ -108,3 +153,286 @@ def test_export_batch_csv(export_manager, tmp_path):
         content = Path(result).read_text()
         assert "P1" in content
         assert "R1" in content
+
+
+def test_export_batch_json_streams_results(export_manager, tmp_path):
+    """JSON batch exports match json.dumps output when results are an iterator."""
+    import json
+
+    batch_data = {
+        "id": "batch-123",
+        "config": {"model": "gpt-4o"},
+        "results": [
+            {"prompt_index": 0, "prompt": "P1\nline", "response": "R1"},
+            {"prompt_index": 1, "prompt": "P2", "response": None},
+        ],
+    }
+    with patch.object(export_manager, '_get_batch_data') as mock_get:
+        mock_get.return_value = dict(batch_data, results=iter(batch_data["results"]))
+        output_file = tmp_path / "batch.json"
+        export_manager.export_batch("batch-123", "json", output_file=output_file)
+
+    assert output_file.read_text() == json.dumps(batch_data, indent=2)
+
+
+def test_export_batch_csv_rows(export_manager, tmp_path):
+    """Test batch CSV columns, including defaults for missing fields."""
+    import csv
+
+    with patch.object(export_manager, '_get_batch_data') as mock_get:
+        mock_get.return_value = {
+            "id": "batch-123",
+            "results": iter([
+                {"prompt_index": 0, "prompt": "P1", "response": "R1", "success": True,
+                 "error": None, "tokens_used": 10, "cost": 0.01},
+                {"prompt_index": 1, "prompt": "P2", "success": False, "error": "Boom"},
+            ])
+        }
+        output_file = tmp_path / "batch.csv"
+        export_manager.export_batch("batch-123", "csv", output_file=output_file)
+
+    with open(output_file, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["index", "prompt", "response", "success", "error", "tokens", "cost"],
+        ["0", "P1", "R1", "True", "", "10", "0.01"],
+        ["1", "P2", "", "False", "Boom", "0", "0"],
+    ]
+
+
+def test_export_reuses_read_only_connection(export_manager, tmp_path):
+    """Test exports share one read-only connection per database until close()."""
+    import sqlite3
+
+    db_path = tmp_path / "batch.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE batch_runs (id TEXT PRIMARY KEY, config TEXT)")
+    conn.execute("CREATE TABLE batch_results (batch_id TEXT, prompt_index INTEGER, prompt TEXT)")
+    conn.execute("INSERT INTO batch_runs VALUES ('batch-123', NULL)")
+    conn.execute("INSERT INTO batch_results VALUES ('batch-123', 0, 'P1')")
+    conn.commit()
+    conn.close()
+    export_manager.batch_db_path = db_path
+
+    with export_manager:
+        for output_format in ("csv", "json"):
+            output_file = tmp_path / f"batch.{output_format}"
+            export_manager.export_batch("batch-123", output_format, output_file=output_file)
+            assert "P1" in output_file.read_text()
+        assert list(export_manager._connections) == [db_path]
+        with pytest.raises(sqlite3.OperationalError):
+            export_manager._connect(db_path).execute("DELETE FROM batch_results")
+
+    assert export_manager._connections == {}
+
+
+def test_export_batch_data_cached_until_invalidated(export_manager, tmp_path):
+    """Test batch details are read once per item, and results on every export."""
+    import sqlite3
+
+    db_path = tmp_path / "batch.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE batch_runs (id TEXT PRIMARY KEY, config TEXT)")
+    conn.execute("CREATE TABLE batch_results (batch_id TEXT, prompt_index INTEGER, prompt TEXT)")
+    conn.execute("INSERT INTO batch_runs VALUES ('batch-123', '{\"model\": \"gpt-4o\"}')")
+    conn.execute("INSERT INTO batch_results VALUES ('batch-123', 0, 'P1')")
+    conn.commit()
+    export_manager.batch_db_path = db_path
+
+    with patch.object(export_manager, '_get_batch_run', wraps=export_manager._get_batch_run) as spy:
+        first = export_manager.export_batch("batch-123", "json")
+        conn.execute("INSERT INTO batch_results VALUES ('batch-123', 1, 'P2')")
+        conn.commit()
+        second = export_manager.export_batch("batch-123", "json")
+        assert spy.call_count == 1
+        export_manager.invalidate("batch-123")
+        export_manager.export_batch("batch-123", "json")
+        assert spy.call_count == 2
+
+    conn.close()
+    export_manager.close()
+    assert "P2" not in first
+    assert "P2" in second
+
+
+def test_get_conversation_data_messages(export_manager, tmp_path):
+    """Test conversation messages are read as dicts in datetime order."""
+    import sqlite3
+
+    db_path = tmp_path / "logs.db"
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("CREATE TABLE conversations (id TEXT PRIMARY KEY, name TEXT, model TEXT)")
+    conn.execute(
+        "CREATE TABLE responses (id TEXT, conversation_id TEXT, prompt TEXT, datetime_utc TEXT)"
+    )
+    conn.execute("INSERT INTO conversations VALUES ('c1', 'Chat', 'gpt-4o')")
+    conn.execute("INSERT INTO responses VALUES ('r2', 'c1', 'Second', '2024-01-02')")
+    conn.execute("INSERT INTO responses VALUES ('r1', 'c1', 'First', '2024-01-01')")
+    conn.commit()
+    conn.close()
+    export_manager.logs_db_path = db_path
+
+    data = export_manager._get_conversation_data("c1")
+    export_manager.close()
+
+    assert data["name"] == "Chat"
+    assert data["messages"] == [
+        {"id": "r1", "conversation_id": "c1", "prompt": "First", "datetime_utc": "2024-01-01"},
+        {"id": "r2", "conversation_id": "c1", "prompt": "Second", "datetime_utc": "2024-01-02"},
+    ]
+
+
+def test_export_creates_output_directory_once(export_manager, tmp_path):
+    """Test mkdir only runs for the first export into a directory."""
+    batch_data = {"id": "batch-123", "results": []}
+    output_dir = tmp_path / "exports"
+    with patch.object(export_manager, '_get_batch_data', return_value=batch_data), \
+            patch.object(Path, 'mkdir', autospec=True, side_effect=Path.mkdir) as mkdir:
+        for output_format in ("csv", "json", "csv"):
+            result = export_manager.export_batch(
+                "batch-123", output_format, output_file=str(output_dir / f"b.{output_format}")
+            )
+            assert Path(result).exists()
+
+    assert mkdir.call_count == 1
+
+
+def test_failed_export_keeps_existing_file(export_manager, tmp_path):
+    """Test an export that fails part way leaves the previous file intact."""
+    conversation = {"id": "test-123", "name": "Test", "model": "gpt-4o", "messages": []}
+
+    def failing_results():
+        yield {"prompt_index": 0, "prompt": "P1", "response": "R1"}
+        raise RuntimeError("database error")
+
+    output_dir = tmp_path / "exports"
+    output_dir.mkdir()
+    html_file = output_dir / "conversation.html"
+    html_file.write_text("previous html")
+    with patch.object(export_manager, '_get_conversation_data', return_value=conversation):
+        with pytest.raises(KeyError):
+            export_manager.export_conversation(
+                "test-123", "html", output_file=html_file, template="{missing}"
+            )
+
+    for output_format in ("csv", "json"):
+        batch_file = output_dir / f"batch.{output_format}"
+        batch_file.write_text("previous batch")
+        batch_data = {"id": "batch-123", "results": failing_results()}
+        with patch.object(export_manager, '_get_batch_data', return_value=batch_data):
+            with pytest.raises(RuntimeError):
+                export_manager.export_batch("batch-123", output_format, output_file=batch_file)
+        assert batch_file.read_text() == "previous batch"
+
+    assert html_file.read_text() == "previous html"
+    # No temporary files are left behind
+    assert sorted(path.name for path in output_dir.iterdir()) == [
+        "batch.csv", "batch.json", "conversation.html"
+    ]
+
+
+def test_html_conversation_message_blocks():
+    """Test the HTML written for each kind of message."""
+    from llm.exporters.html import HTMLExporter
+
+    html = HTMLExporter(template="{content}").export_conversation({
+        "id": "c1",
+        "name": "Chat",
+        "messages": [
+            {"system": "Be <brief>", "prompt": "Hi", "response": "Hello & welcome",
+             "datetime_utc": "2024-01-01T00:00:00"},
+            {"prompt": "Bye", "response": ""},
+        ]
+    })
+
+    # Skip the header block, whose last three lines close a div
+    assert html.split("</div>\n", 3)[-1] == (
+        '<div class="message system-message">\n'
+        '<div class="role">System</div>\n'
+        '<div class="content">Be &lt;brief&gt;</div>\n'
+        '</div>\n'
+        '<div class="message user-message">\n'
+        '<div class="role">User</div>\n'
+        '<div class="content">Hi</div>\n'
+        '<div class="timestamp">2024-01-01T00:00:00</div>\n'
+        '</div>\n'
+        '<div class="message assistant-message">\n'
+        '<div class="role">Assistant</div>\n'
+        '<div class="content">Hello &amp; welcome</div>\n'
+        '</div>\n'
+        '<div class="message user-message">\n'
+        '<div class="role">User</div>\n'
+        '<div class="content">Bye</div>\n'
+        '</div>'
+    )
+
+
+def test_markdown_conversation_output():
+    """Test the Markdown written for a conversation."""
+    from llm.exporters.markdown import MarkdownExporter
+
+    markdown = MarkdownExporter().export_conversation({
+        "id": "c1",
+        "name": "Chat",
+        "model": "gpt-4o",
+        "messages": [
+            {"system": "Be brief", "prompt": "Hi", "response": "Hello",
+             "datetime_utc": "2024-01-01T00:00:00"},
+            {"prompt": "Bye", "response": ""},
+        ]
+    })
+
+    assert markdown == (
+        "# Chat\n\n"
+        "**Model:** gpt-4o  \n"
+        "**ID:** c1  \n"
+        "\n---\n"
+        "\n### 🔧 System\n\n```\nBe brief\n```\n"
+        "\n### 👤 User (2024-01-01T00:00:00)\n\nHi\n"
+        "\n### 🤖 Assistant\n\nHello\n"
+        "\n---\n"
+        "\n### 👤 User\n\nBye\n"
+    )
+
+
+def test_html_comparison_escapes_model_names():
+    """Test model names are escaped everywhere they appear in a comparison."""
+    from llm.exporters.html import HTMLExporter
+
+    html = HTMLExporter(template="{content}").export_comparison({
+        "prompt": "Test",
+        "models": ["<model>"],
+        "responses": [
+            {"model": "<model>", "success": True, "time": 1.0, "cost": 0.01, "text": "Hi"}
+        ],
+    })
+
+    assert "<model>" not in html
+    assert html.count("&lt;model&gt;") == 4
+
+
+@pytest.mark.parametrize("template", [
+    None,
+    "{{{title}}}<p>{content}</p>{{}}",
+    "{title:>12}|{content!r}",
+    "{content}",
+])
+def test_html_template_matches_str_format(template):
+    """Test split templates render exactly as str.format would."""
+    from llm.exporters.html import DEFAULT_TEMPLATE, HTMLExporter
+
+    html = HTMLExporter(template=template).export_comparison({
+        "prompt": "Test",
+        "models": [],
+        "responses": [],
+    })
+    content = HTMLExporter(template="{content}").export_comparison({
+        "prompt": "Test",
+        "models": [],
+        "responses": [],
+    })
+
+    expected = (template or DEFAULT_TEMPLATE).format(
+        title="Model Comparison", content=content
+    )
+    assert html == expected
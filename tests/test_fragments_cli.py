@@ -1,4 +1,5 @@
 from click.testing import CliRunner
+import json
 from llm.cli import cli
 import yaml
 import sqlite_utils
@@ -123,3 +124,58 @@ def test_fragments_list(user_path):
                 """
             ).strip()
         )
+
+
+def test_fragments_list_json(user_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        assert runner.invoke(cli, ["fragments", "list", "--json"]).output == "[]\n"
+        open("fragment1.txt", "w").write("Hello\nfragment 1")
+        open("fragment2.txt", "w").write("Hello fragment 2")
+        for alias, path in (("f1", "fragment1.txt"), ("f2", "fragment2.txt")):
+            assert runner.invoke(cli, ["fragments", "set", alias, path]).exit_code == 0
+        result = runner.invoke(cli, ["fragments", "list", "--json"])
+        assert result.exit_code == 0
+        loaded = json.loads(result.output)
+        assert sorted((row["content"], row["aliases"]) for row in loaded) == [
+            ("Hello\nfragment 1", ["f1"]),
+            ("Hello fragment 2", ["f2"]),
+        ]
+        # Output should match json.dumps(..., indent=4) of the full list
+        assert result.output == json.dumps(loaded, indent=4) + "\n"
+
+
+def test_fragments_remove_multiple(user_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        open("fragment1.txt", "w").write("Hello fragment 1")
+        for alias in ("f1", "f2", "f3"):
+            assert (
+                runner.invoke(cli, ["fragments", "set", alias, "fragment1.txt"]).exit_code
+                == 0
+            )
+        result = runner.invoke(cli, ["fragments", "remove", "f1", "f3"])
+        assert result.exit_code == 0
+        listed = yaml.safe_load(runner.invoke(cli, ["fragments", "list"]).output)
+        assert listed[0]["aliases"] == ["f2"]
+        # Every alias is validated before anything is removed
+        result2 = runner.invoke(cli, ["fragments", "remove", "f2", "bad alias"])
+        assert result2.exit_code == 2
+        assert "Fragment alias must be alphanumeric" in result2.output
+        listed2 = yaml.safe_load(runner.invoke(cli, ["fragments", "list"]).output)
+        assert listed2[0]["aliases"] == ["f2"]
+
+
+def test_fragments_list_not_truncated_when_piped(user_path):
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        long_content = "x" * 200
+        open("fragment1.txt", "w").write(long_content)
+        assert (
+            runner.invoke(cli, ["fragments", "set", "f1", "fragment1.txt"]).exit_code
+            == 0
+        )
+        # CliRunner output is not a TTY, so full content should be returned
+        result = runner.invoke(cli, ["fragments", "list"])
+        assert result.exit_code == 0
+        assert yaml.safe_load(result.output)[0]["content"] == long_content
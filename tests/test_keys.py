@@ -38,6 +38,12 @@ def test_keys_set(monkeypatch, tmpdir):
         "// Note": "This file stores secret API credentials. Do not share!",
         "openai": "foo",
     }
+    # Setting another key keeps the first one and the permissions
+    result2 = runner.invoke(cli, ["keys", "set", "other"], input="bar")
+    assert result2.exit_code == 0
+    assert oct(keys_path.stat().mode)[-3:] == "600"
+    assert json.loads(keys_path.read_text("utf-8"))["openai"] == "foo"
+    assert not (user_path / "keys.json.tmp").exists()
 
 
 @pytest.mark.xfail(sys.platform == "win32", reason="Expected to fail on Windows")
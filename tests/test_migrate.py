@@ -52,6 +52,16 @@ def test_migrate_blank():
     }
 
 
+def test_migrate_indexes_responses_conversation_id_datetime():
+    db = sqlite_utils.Database(memory=True)
+    migrate(db)
+    columns = [index.columns for index in db["responses"].indexes]
+    # A single index serves lookups by conversation and by conversation and time
+    assert [c for c in columns if c[0] == "conversation_id"] == [
+        ["conversation_id", "datetime_utc"]
+    ]
+
+
 @pytest.mark.parametrize("has_record", [True, False])
 def test_migrate_from_original_schema(has_record):
     db = sqlite_utils.Database(memory=True)
@@ -115,6 +125,9 @@ def test_migrations_for_embeddings():
     }
     assert db["embeddings"].foreign_keys[0].column == "collection_id"
     assert db["embeddings"].foreign_keys[0].other_table == "collections"
+    assert ["collection_id", "content_hash"] in [
+        index.columns for index in db["embeddings"].indexes
+    ]
 
 
 def test_backfill_content_hash():
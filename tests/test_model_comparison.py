@@ -8,7 +8,8 @@ from llm.model_comparison import ModelComparison
 def comparison(user_path):
     """Create a ModelComparison instance with test database."""
     db_path = user_path / "test_comparisons.db"
-    return ModelComparison(db_path=db_path)
+    with ModelComparison(db_path=db_path) as comparison:
+        yield comparison
 
 
 @pytest.fixture
@@ -67,6 +68,109 @@ def test_compare_with_system_prompt(comparison):
         assert result["system_prompt"] == "You are a helpful assistant"
 
 
+def test_compare_runs_models_concurrently(comparison):
+    """Test that models are prompted concurrently, keeping results in order."""
+    import threading
+
+    # Both calls must be in flight at once for the barrier to release
+    barrier = threading.Barrier(2, timeout=5)
+
+    def get_model(model_name):
+        model = Mock()
+
+        def text():
+            barrier.wait()
+            return f"Response from {model_name}"
+
+        model.prompt.return_value = Mock(text=text, input_tokens=1, output_tokens=1)
+        return model
+
+    with patch('llm.model_comparison.get_model', side_effect=get_model):
+        result = comparison.compare(
+            prompt="Test", models=["slow", "fast"], save=False
+        )
+
+    assert [r["model"] for r in result["responses"]] == ["slow", "fast"]
+    assert [r["text"] for r in result["responses"]] == [
+        "Response from slow",
+        "Response from fast",
+    ]
+    assert all(r["success"] for r in result["responses"])
+
+
+def test_compare_limits_concurrent_models(comparison):
+    """Test that at most MAX_CONCURRENT_MODELS models are prompted at once."""
+    import threading
+    import time
+    from llm.model_comparison import MAX_CONCURRENT_MODELS
+
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def get_model(model_name):
+        def text():
+            with lock:
+                in_flight.append(model_name)
+                peak.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(model_name)
+            return model_name
+
+        model = Mock()
+        model.prompt.return_value = Mock(text=text, input_tokens=1, output_tokens=1)
+        return model
+
+    models = [f"model-{i}" for i in range(MAX_CONCURRENT_MODELS + 4)]
+    with patch('llm.model_comparison.get_model', side_effect=get_model):
+        result = comparison.compare(prompt="Test", models=models, save=False)
+
+    assert [r["text"] for r in result["responses"]] == models
+    assert 1 < max(peak) <= MAX_CONCURRENT_MODELS
+
+
+def test_compare_creates_one_cost_tracker(comparison):
+    """Test that every model's cost is calculated with one shared tracker."""
+    def get_model(model_name):
+        model = Mock()
+        model.prompt.return_value = Mock(
+            text=lambda: "Response", input_tokens=10, output_tokens=20
+        )
+        return model
+
+    with patch('llm.model_comparison.get_model', side_effect=get_model), \
+            patch('llm.model_comparison.CostTracker') as tracker_class:
+        tracker_class.return_value.calculate_cost.return_value = 0.5
+        for _ in range(2):
+            result = comparison.compare(prompt="Test", models=["a", "b", "c"], save=False)
+
+    assert tracker_class.call_count == 1
+    assert tracker_class.return_value.calculate_cost.call_count == 6
+    assert [r["cost"] for r in result["responses"]] == [0.5, 0.5, 0.5]
+
+
+def test_compare_without_token_usage(comparison):
+    """Test that responses without usage report zero tokens and skip costing."""
+    responses = [Mock(spec=["text"]), Mock(input_tokens=None, output_tokens=None)]
+    for response in responses:
+        response.text.return_value = "Response"
+    models = [Mock(), Mock()]
+    for model, response in zip(models, responses):
+        model.prompt.return_value = response
+
+    with patch('llm.model_comparison.get_model', side_effect=models), \
+            patch('llm.model_comparison.CostTracker') as tracker_class:
+        tracker_class.return_value.calculate_cost.return_value = 0.0
+        result = comparison.compare(prompt="Test", models=["a", "b"], save=False)
+
+    for response_data in result["responses"]:
+        assert response_data["success"] is True
+        assert response_data["tokens"] == {"input": 0, "output": 0, "total": 0}
+        assert response_data["cost"] == 0.0
+    assert tracker_class.return_value.calculate_cost.call_count == 1
+
+
 def test_compare_tracks_metrics(comparison):
     """Test that comparison tracks time, tokens, and cost."""
     with patch('llm.get_model') as mock_get_model:
@@ -179,6 +283,33 @@ def test_list_comparisons_limit(comparison):
         assert len(comparisons) == 3
 
 
+def test_list_comparisons_without_results(comparison):
+    """Test listing comparison metadata without their responses and metrics."""
+    def get_model(model_name):
+        model = Mock()
+        model.prompt.return_value = Mock(
+            text=lambda: "Response", input_tokens=10, output_tokens=5
+        )
+        return model
+
+    with patch('llm.model_comparison.get_model', side_effect=get_model):
+        saved = comparison.compare("Prompt", ["model1", "model2"], save=True)
+
+    [full] = comparison.list_comparisons()
+    [summary] = comparison.list_comparisons(include_results=False)
+
+    assert full["responses"] == saved["responses"]
+    assert full["metrics"] == saved["metrics"]
+    assert summary == {
+        "id": saved["id"],
+        "created_at": saved["created_at"],
+        "prompt": "Prompt",
+        "system_prompt": None,
+        "models": ["model1", "model2"],
+        "notes": None,
+    }
+
+
 def test_get_best_model_by_cost(comparison):
     """Test finding best model by cost."""
     result = {
@@ -336,3 +467,14 @@ def test_format_comparison_with_errors(comparison):
     assert "Success response" in text
     assert "ERROR" in text
     assert "Connection timeout" in text
+
+
+def test_close_closes_cost_tracker(comparison):
+    """Test close() closes the connection and the shared cost tracker."""
+    import sqlite3
+
+    tracker = comparison._get_cost_tracker()
+    comparison.close()
+    for conn in (comparison._conn, tracker._conn):
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -551,6 +551,59 @@ class ToolboxPlugin:
         register(Filesystem)
 
 
+def test_get_tools_cached_until_plugins_change():
+    def shout(text: str) -> str:
+        return text.upper()
+
+    class ShoutPlugin:
+        __name__ = "ShoutPlugin"
+
+        @hookimpl
+        def register_tools(self, register):
+            register(shout)
+
+    assert "shout" not in llm.get_tools()
+    try:
+        plugins.pm.register(ShoutPlugin(), name="ShoutPlugin")
+        tools = llm.get_tools()
+        # Hooks are not called again, so the same Tool is returned
+        assert llm.get_tools()["shout"] is tools["shout"]
+        # But callers get their own dictionary
+        tools.pop("shout")
+        assert "shout" in llm.get_tools()
+    finally:
+        plugins.pm.unregister(name="ShoutPlugin")
+    assert "shout" not in llm.get_tools()
+
+
+def test_clear_plugin_caches():
+    names = ["first"]
+
+    class NamedToolPlugin:
+        __name__ = "NamedToolPlugin"
+
+        @hookimpl
+        def register_tools(self, register):
+            def tool(text: str) -> str:
+                return text
+
+            register(tool, name=names[0])
+
+    try:
+        plugins.pm.register(NamedToolPlugin(), name="NamedToolPlugin")
+        assert "first" in llm.get_tools()
+        names[0] = "second"
+        # Still cached, as the registered plugins have not changed
+        assert "first" in llm.get_tools()
+        llm.clear_plugin_caches()
+        tools = llm.get_tools()
+        assert "second" in tools
+        assert "first" not in tools
+    finally:
+        plugins.pm.unregister(name="NamedToolPlugin")
+        llm.clear_plugin_caches()
+
+
 def test_register_toolbox(tmpdir, logs_db):
     # Test the Python API
     model = llm.get_model("echo")
@@ -275,3 +275,26 @@ def test_prompt_metadata(library):
     prompt = library.get_prompt("meta")
     assert prompt["metadata"]["key1"] == "value1"
     assert prompt["metadata"]["key2"] == 123
+
+
+def test_prompts_use_cli_variables(user_path):
+    """Test variable substitution and missing variables in llm prompts use."""
+    from click.testing import CliRunner
+    from llm.cli import cli
+
+    PromptLibrary(db_path=user_path / "prompts.db").add_prompt(
+        name="greet", prompt="Hi {name}, {name}! {greeting} {other}", model="echo"
+    )
+    runner = CliRunner()
+    result = runner.invoke(cli, ["prompts", "use", "greet", "--var", "name={other}"])
+    assert result.exit_code == 1
+    assert "Missing variables: greeting, other" in result.output
+
+    result2 = runner.invoke(
+        cli,
+        ["prompts", "use", "greet", "--var", "name={other}"]
+        + ["--var", "greeting=Hello", "--var", "other=there"],
+    )
+    assert result2.exit_code == 0
+    # Substituted values are not themselves scanned for variables
+    assert json.loads(result2.output)["prompt"] == "Hi {other}, {other}! Hello there"
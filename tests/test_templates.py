@@ -413,6 +413,22 @@ def test_execute_prompt_from_template_path():
         }
 
 
+def test_load_template_cached_on_mtime(templates_path):
+    from llm.cli import load_template
+
+    path = templates_path / "cached.yaml"
+    path.write_text("prompt: one\ndefaults:\n  a: b", "utf-8")
+    template1 = load_template("cached")
+    assert template1.prompt == "one"
+    assert template1._functions_is_trusted
+    # Modifying a returned template should not affect the cached copy
+    template1.defaults["a"] = "changed"
+    assert load_template("cached").defaults == {"a": "b"}
+    # Changing the file should be picked up
+    path.write_text("prompt: two, changed\ndefaults:\n  a: b", "utf-8")
+    assert load_template("cached").prompt == "two, changed"
+
+
 FUNCTIONS_EXAMPLE = """
 def greet(name: str) -> str:
     return f"Hello, {name}!"
@@ -343,6 +343,22 @@ def test_functions_tool_locals():
     assert result.exit_code == 0
 
 
+def test_tools_from_code_file_cached(tmpdir):
+    path = tmpdir / "tools.py"
+    path.write_text(
+        'def one(a: int) -> int:\n    "Return one"\n    return 1\n', "utf-8"
+    )
+    tools = cli._tools_from_code(str(path))
+    assert [(tool.name, tool.description) for tool in tools] == [("one", "Return one")]
+    # Cached code objects still produce fresh functions
+    assert cli._tools_from_code(str(path))[0].implementation is not (
+        tools[0].implementation
+    )
+    # Editing the file is picked up
+    path.write_text('def two() -> int:\n    "Return two"\n    return 2\n', "utf-8")
+    assert [tool.name for tool in cli._tools_from_code(str(path))] == ["two"]
+
+
 def test_default_tool_llm_time():
     runner = CliRunner()
     result = runner.invoke(
@@ -593,3 +609,20 @@ async def test_chain_async_cancel_only_first_of_two():
     assert results[1].name == "t2"
     assert results[1].output == "ran2"
     assert results[1].exception is None
+
+
+@pytest.mark.parametrize(
+    "output,expected",
+    (
+        ('{"a": [1]}', '  {\n    "a": [\n      1\n    ]\n  }\n'),
+        ('{\n    "a": 1\n}', '  {\n      "a": 1\n  }\n'),
+        ("not json", "  not json\n"),
+    ),
+)
+def test_debug_tool_call_output(capsys, output, expected):
+    cli._debug_tool_call(
+        None,
+        llm.ToolCall(name="t", arguments={}),
+        llm.ToolResult(name="t", output=output),
+    )
+    assert capsys.readouterr().err == "\nTool call: t({})\n" + expected + "\n"